@@ -1,21 +1,22 @@
-import json
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_ollama import ChatOllama
 from langchain_core.tools import tool
+from jobsearch.toolcalls import ToolExecutor, invokeToolCalls
+from jobsearch.repository import JsonFileRepository
+
+# parsed once, reloaded when the file changes
+jobDescriptions = JsonFileRepository('data/jd_{id}.json',prewarm=True)
+candidateProfiles = JsonFileRepository('data/cand_{id}.json',prewarm=True)
 
 @tool
 def getJobDescription(id: str) -> dict[str,any]:
     """Get Job Description by ID"""
-    with open('data/jd_'+id+'.json','r') as file:
-        data = json.load(file)
-    return data #json.dump(data)
+    return jobDescriptions.get(id)
 
 @tool
 def getCandidateProfile(id: str) -> dict[str,any]:
     """Get Candidate Profile by ID"""
-    with open('data/cand_'+id+'.json','r') as file:
-        data = json.load(file)
-    return data #json.dump(data)
+    return candidateProfiles.get(id)
 
 def run_agent(chain,toolsDict,userInput):
     steps = []
@@ -32,12 +33,10 @@ def run_agent(chain,toolsDict,userInput):
             return aiMsg
         else:
             steps.append(aiMsg)
-            for t in aiMsg.tool_calls:
-                #print('---')
-                tool = toolsDict[t['name']]
-                toolMsg = tool.invoke(t)
-                #print(toolMsg)
-                steps.append(toolMsg)
+            # independent calls of one turn run concurrently, messages stay in call order
+            toolMsgs = invokeToolCalls(toolExecutor,toolsDict,aiMsg.tool_calls)
+            #print(toolMsgs)
+            steps.extend(toolMsgs)
 
 # gemma3 and phi4 do not support "calling tools"
 #ollamaModel = "gemma3:4b"
@@ -82,6 +81,8 @@ model = ChatOllama(
 
 chain = template | model 
 
+toolExecutor = ToolExecutor(timeout=30)
+
 response = run_agent(chain,toolsDict,{
     "role":role,"task":task,"instruction":instruction,
     "jd_id":"A","cand_id":"A",
@@ -1,25 +1,26 @@
 import operator
-import json
 from typing import TypedDict, Annotated
 from langchain_core.messages import AnyMessage
 from langchain_core.tools import tool
+from jobsearch.toolcalls import ToolExecutor, invokeToolCalls
 from langgraph.graph import StateGraph, START, END
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_ollama import ChatOllama
+from jobsearch.repository import JsonFileRepository
+
+# parsed once, reloaded when the file changes
+jobDescriptions = JsonFileRepository('data/jd_{id}.json',prewarm=True)
+candidateProfiles = JsonFileRepository('data/cand_{id}.json',prewarm=True)
 
 @tool
 def getJobDescription(id: str) -> dict[str,any]:
     """Get Job Description by ID"""
-    with open('data/jd_'+id+'.json','r') as file:
-        data = json.load(file)
-    return data 
+    return jobDescriptions.get(id)
 
 @tool
 def getCandidateProfile(id: str) -> dict[str,any]:
     """Get Candidate Profile by ID"""
-    with open('data/cand_'+id+'.json','r') as file:
-        data = json.load(file)
-    return data
+    return candidateProfiles.get(id)
 
 role = "You are a experienced developer seeking from Hong Kong seeking for job in UK IT industry"
 task = """
@@ -63,6 +64,7 @@ class Agent:
             "getJobDescription": getJobDescription,
             "getCandidateProfile": getCandidateProfile
         }
+        self.toolExecutor = ToolExecutor(timeout=30)
 
         ollamaModel = "llama3.2"
 
@@ -95,13 +97,9 @@ class Agent:
     def toolsNode(self, state:AgentState) -> AgentState:
         print('here2')
         lastAIMsg = state['msg'][-1]
-        toolMsgs = []
-        for t in lastAIMsg.tool_calls:
-            print(t)
-            tool = self.toolsDict[t['name']]
-            toolMsg = tool.invoke(t)
-            print(toolMsg)
-            toolMsgs.append(toolMsg)
+        print(lastAIMsg.tool_calls)
+        toolMsgs = invokeToolCalls(self.toolExecutor,self.toolsDict,lastAIMsg.tool_calls)
+        print(toolMsgs)
         return {'msg': toolMsgs}
 
     def needsToolsCalling(self, state:AgentState) -> bool:
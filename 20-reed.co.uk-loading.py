@@ -1,9 +1,13 @@
-import os,json,requests,time
+import os,json,requests,time,asyncio
+from jobsearch.crawler import ReedCrawler
+from jobsearch.manifest import CrawlManifest
+from jobsearch.corpus import JobCorpus
 
 # reed.co.uk api reference
 # https://www.reed.co.uk/developers/jobseeker
 
-baseUrl="https://www.reed.co.uk/api/1.0"
+# REED_BASE_URL can point to a local stub server for testing
+baseUrl=os.environ.get("REED_BASE_URL","https://www.reed.co.uk/api/1.0")
 apiKey=os.environ['REED_API_KEY']
 
 searchURL=f"{baseUrl}/search"
@@ -11,21 +15,52 @@ searchURL=f"{baseUrl}/search"
 keywords="developer"
 location="london"
 
-def getJobDetail(jobId:str) -> None:
+# "async" crawls with ReedCrawler, "sync" keeps the original one-job-at-a-time loop
+crawlMode=os.environ.get("REED_CRAWL_MODE","async")
+# "corpus" appends to the JobCorpus stores, "files" writes one json file per job
+storage=os.environ.get("REED_STORAGE","corpus")
+
+def saveSearchResult(job:dict) -> None:
+    jobId=job['jobId']
+    if storage == "corpus":
+        # flushed before the manifest records the job, so a crash cannot lose it
+        searchResults.put(jobId,job)
+        searchResults.flush()
+    else:
+        with open(f"reed.co.uk/search-results/search-result_{jobId}.json","w") as outfile:
+            outfile.write(json.dumps(job, indent=4))
+
+def saveJobDetail(jobId:str,detail:dict) -> None:
+    if storage == "corpus":
+        print(f"saving job {jobId} into corpus")
+        jobDetails.put(jobId,detail)
+        jobDetails.flush()
+    else:
+        with open(f"reed.co.uk/job-details/job_{jobId}.json","w") as outfile:
+            print(f"saving file job_{jobId}.json")
+            outfile.write(json.dumps(detail, indent=4))
+
+def getJobDetail(jobId:str,manifest:CrawlManifest) -> None:
     response=requests.get(
         f"{baseUrl}/jobs/{jobId}",
         auth=(apiKey,"")
     )
 
     if response.status_code == 200:
-        with open(f"reed.co.uk/job-details/job_{jobId}.json","w") as outfile:
-            print(f"saving file job_{jobId}.json")
-            outfile.write(json.dumps(response.json(), indent=4))
+        detail=response.json()
+        if manifest.detailChanged(jobId,detail):
+            saveJobDetail(jobId,detail)
+        # only marked as fetched once the detail is saved
+        manifest.recordJobDetail(jobId,detail)
 
-def search(keywords:str,location:str) -> None:
+def search(keywords:str,location:str,manifest:CrawlManifest) -> None:
     resultsToTake=100
-    resultsToSkip=0
-    page=1
+    resultsToSkip=manifest.loadCursor(keywords,location)
+    page=resultsToSkip//resultsToTake+1
+
+    for jobId in manifest.pendingJobIds():
+        getJobDetail(jobId,manifest)
+        time.sleep(1)
 
     hasNextPage=True
     while hasNextPage:
@@ -51,12 +86,43 @@ def search(keywords:str,location:str) -> None:
             for job in results:
                 #print(job)
                 jobId=job['jobId']
-                with open(f"reed.co.uk/search-results/search-result_{jobId}.json","w") as outfile:
-                    outfile.write(json.dumps(job, indent=4))
-                getJobDetail(jobId)
+                if manifest.searchResultChanged(job):
+                    saveSearchResult(job)
+                if manifest.recordSearchResult(job):
+                    getJobDetail(jobId,manifest)
+                    time.sleep(1)
+            if hasNextPage:
+                manifest.saveCursor(keywords,location,resultsToSkip)
+            else:
+                manifest.clearCursor(keywords,location)
+
+os.makedirs("reed.co.uk/search-results",exist_ok=True)
+os.makedirs("reed.co.uk/job-details",exist_ok=True)
 
-                time.sleep(1)
+searchResults=JobCorpus("reed.co.uk/corpus/search-results")
+jobDetails=JobCorpus("reed.co.uk/corpus/job-details")
 
-os.makedirs("reed.co.uk/search-results")
-os.makedirs("reed.co.uk/job-details")
-search(keywords,location)
\ No newline at end of file
+# remembers fetched jobs and the paging cursor, so a re-run only fetches
+# new or changed postings and an interrupted crawl resumes where it stopped
+manifest=CrawlManifest("reed.co.uk/manifest.db")
+
+try:
+    if crawlMode == "async":
+        crawler=ReedCrawler(
+            apiKey,
+            baseUrl=baseUrl,
+            rate=float(os.environ.get("REED_RATE","2")),
+            burst=int(os.environ.get("REED_BURST","10")),
+            concurrency=int(os.environ.get("REED_CONCURRENCY","8")),
+            manifest=manifest,
+            onSearchResult=saveSearchResult,
+            onJobDetail=saveJobDetail,
+        )
+        asyncio.run(crawler.crawl(keywords,location))
+    else:
+        search(keywords,location,manifest)
+finally:
+    # the corpus stores first, the manifest must never be ahead of them
+    searchResults.close()
+    jobDetails.close()
+    manifest.close()
@@ -0,0 +1,10 @@
+from jobsearch.corpus import JobCorpus, migrateDirectory
+
+# One-off import of the json files written by earlier crawls
+# (reed.co.uk/search-results, reed.co.uk/job-details) into the corpus stores
+
+counts=migrateDirectory("reed.co.uk","reed.co.uk/corpus")
+print(counts)
+
+with JobCorpus("reed.co.uk/corpus/job-details") as jobDetails:
+    print(f"{len(jobDetails)} jobs in corpus")
@@ -0,0 +1,17 @@
+import time
+from jobsearch.corpus import JobCorpus
+from jobsearch.normalize import NormalizedCache, normalizeCorpus
+
+# Bulk html-to-text pass over the job details corpus. The normalized text is
+# cached by jobId and content hash, so the next pass only parses new or
+# changed jobs.
+
+if __name__ == "__main__":
+    with JobCorpus("reed.co.uk/corpus/job-details") as jobDetails, \
+         NormalizedCache("reed.co.uk/normalized.db") as cache:
+        start=time.monotonic()
+        count=0
+        for job in normalizeCorpus((job for _,job in jobDetails.scan()),cache=cache):
+            count+=1
+        elapsed=time.monotonic()-start
+        print(f"normalized {count} jobs in {elapsed:.1f}s ({count/max(elapsed,1e-9):.0f} jobs/sec)")
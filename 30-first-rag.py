@@ -1,86 +1,107 @@
-import json
-from langchain_community.document_loaders import DirectoryLoader, JSONLoader, BSHTMLLoader
-from langchain_text_splitters import RecursiveJsonSplitter
+import os
 from langchain_ollama import OllamaEmbeddings
-from langchain_core.vectorstores import InMemoryVectorStore
-from langchain_core.documents import Document
-from bs4 import BeautifulSoup
+from jobsearch.corpus import JobCorpus
+from jobsearch.normalize import NormalizedCache
+from jobsearch.embeddings import CachedEmbeddings, ConcurrentEmbeddings, QueryCachedEmbeddings
+from jobsearch.projection import ProjectedEmbeddings, loadOrFitProjection
+from jobsearch.vectorstore import MatrixVectorStore
+from jobsearch.sharding import ShardedSearcher, saveShards, shardsCurrent, shardStore
+from jobsearch.chunking import JobChunker, collapseChunks
+from jobsearch.ingest import pipeline, loadCorpus, buildDocuments, skipUnchanged, chunkDocuments, embedBatches, writeBatches
+from jobsearch.ingest import trackedWriter, evictExpired
+from jobsearch.ingeststate import IngestState
 
-def parseHTMLContent(html:str) -> str:
-    soup=BeautifulSoup(html)
-    return soup.get_text()
+# the shard workers are separate processes, under spawn they import this module again
+if __name__ == "__main__":
+    jobDetails=JobCorpus("reed.co.uk/corpus/job-details")
+    print(len(jobDetails))
 
-def metadata_func(doc:dict,metadata:dict) -> dict:
-    metadata['jobId']=doc['jobId']
-    metadata['jobUrl']=doc['jobUrl']
+    # long descriptions are split into overlapping chunks of at most 256 tokens,
+    # each chunk keeps the jobId of its job in the metadata
+    chunker=JobChunker(chunkSize=256,chunkOverlap=32)
 
-    return metadata
+    # document embeddings are cached on disk by model and content hash,
+    # re-ingesting unchanged jobs does not call the model again, the cache misses
+    # of each ingest batch of 8 chunks are one ollama request, up to 4 in flight
+    cache=CachedEmbeddings(
+        ConcurrentEmbeddings(OllamaEmbeddings(model="llama3.2"),maxInFlight=4,batchSize=8),
+        "reed.co.uk/embeddings.db")
+    # repeated queries are answered from an in-process LRU instead of calling ollama
+    queryCache=QueryCachedEmbeddings(cache,maxsize=1024,ttl=3600)
 
-loader=DirectoryLoader(
-    "reed.co.uk/job-details",
-    glob="*.json",
-    sample_size=20,
-    randomize_sample=True,
-    loader_cls=JSONLoader,
-    loader_kwargs={
-        'jq_schema':'.',
-        'text_content':False,
-        'metadata_func': metadata_func,
-    },
-)
-jsonFiles=loader.load()
-print(len(jsonFiles))
-print(jsonFiles[0])
+    # PCA_DIM=256 searches embeddings projected onto their top 256 principal directions,
+    # same projection file as 31-rag-ingest-redis.py
+    pcaDim=int(os.environ.get("PCA_DIM","0"))
+    if pcaDim:
+        embeddings=ProjectedEmbeddings(queryCache,loadOrFitProjection(f"reed.co.uk/pca-{pcaDim}.npz",pcaDim,lambda: cache.sample(20000)))
+    else:
+        embeddings=queryCache
 
-docs=[]
-for jsonDoc in jsonFiles:
-    job=json.loads(jsonDoc.page_content)
-    metadata={
-        'employerId':job['employerId'],
-        'jobId':job['jobId'],
-        'jobUrl':job['jobUrl'],
-        'externalUrl':job['externalUrl'],
-    }
-    pageContent=f"""
-        Company: {job['employerName']}
-        Location: {job['locationName']}
-        Job Title: {job['jobTitle']}
-        Post Date: {job['datePosted']}
-        Exp Date: {job['expirationDate']}        
-        Job Description:```
-        {parseHTMLContent(job['jobDescription'])}
-        ```
-    """
-    docs.append(Document(id=job['jobId'],page_content=pageContent,metadata=metadata))
-    
-print(len(docs))
-print(docs[0])
+    # all embeddings in one normalized float32 matrix, a query is one matrix-vector product.
+    # the index is saved to disk and memory-mapped on the next run instead of re-ingesting,
+    # set REBUILD_INDEX=1 to ingest again
+    indexDir=f"reed.co.uk/vector-index-pca{pcaDim}" if pcaDim else "reed.co.uk/vector-index"
+    # the jobs written into the index, expired jobs are evicted from a loaded index
+    state=IngestState("reed.co.uk/ingest-state.db",indexName=indexDir)
+    if os.path.exists(os.path.join(indexDir,"index.json")) and os.environ.get("REBUILD_INDEX","0") != "1":
+        vectorStore=MatrixVectorStore.load(indexDir,embeddings)
+        print(f"loaded {len(vectorStore)} documents from {indexDir}")
+        evicted=evictExpired(state,vectorStore)
+        if evicted:
+            print(f"evicted {evicted} expired jobs")
+            vectorStore.save(indexDir)
+    else:
+        vectorStore=MatrixVectorStore(embeddings)
+        state.clear()
 
-#splitter=RecursiveJsonSplitter(max_chunk_size=300)
-#print(type(docs[0].page_content))
-#chunks=splitter.split_json(json.loads(docs[0].page_content))
-#docs=splitter.create_documents(json.loads(docs[0].page_content))
-#print(len(chunks))
-#for c in chunks:
-#    print(c)
+        # load -> normalize/build -> chunk -> embed -> write, each stage in its own
+        # thread with bounded queues in between, only a few batches are in memory
+        for ids in pipeline(
+            loadCorpus(jobDetails,sampleSize=20),
+            buildDocuments(cache=NormalizedCache("reed.co.uk/normalized.db")),
+            skipUnchanged(state),
+            chunkDocuments(chunker),
+            embedBatches(embeddings,batchSize=8),
+            writeBatches(trackedWriter(vectorStore.add_embeddings,vectorStore,state)),
+        ):
+            print(f"added {len(ids)} documents")
+        # brute force is fine for a sample, an IVF index keeps queries fast on the full corpus
+        if len(vectorStore) >= 10000:
+            vectorStore.buildIndex(nprobe=8)
+        # VECTOR_QUANTIZATION=int8|pq searches compressed codes and re-ranks the best ones exactly
+        if os.environ.get("VECTOR_QUANTIZATION"):
+            vectorStore.quantize(os.environ["VECTOR_QUANTIZATION"],rerank=4)
+        vectorStore.save(indexDir)
 
-# docs=splitter.create_documents(texts=[json.loads(docs[0].page_content)])
-# print(len(docs))
-# print(docs[0])
+    # SEARCH_SHARDS=4 splits the index by jobId and searches the shards in parallel worker processes
+    searchShards=int(os.environ.get("SEARCH_SHARDS","0"))
+    if searchShards:
+        shardDir=f"{indexDir}-shards{searchShards}"
+        # the shards are split again only when the index was saved since
+        if shardsCurrent(shardDir,indexDir,searchShards):
+            print(f"reusing the shards in {shardDir}")
+        else:
+            saveShards(shardStore(vectorStore,searchShards),shardDir,source=indexDir)
+        vectorStore=ShardedSearcher(shardDir,embeddings)
 
-embeddings=OllamaEmbeddings(model="llama3.2")
+    # over-fetch chunks, then keep the best chunk of each job
+    results=vectorStore.similarity_search_with_score(query="Tech Lead in London",k=20)
+    results=collapseChunks(results,k=5)
+    print(len(results))
+    for doc,score in results:
+        print(f"SIM:{score:3f}, {doc.metadata} {doc.page_content[:50]}")
 
-vectors=embeddings.embed_documents(docs[0].page_content)
-print(len(vectors))
-print(docs[0],vectors[0])
+    # the candidate expectations as a metadata filter, only the matching rows are scored
+    results=vectorStore.similarity_search_with_score(query="Tech Lead",k=20,filter={
+        'locationName':'London',
+        'fullTime':True,
+        'salary':(45000,55000),
+    })
+    results=collapseChunks(results,k=5)
+    print(len(results))
+    for doc,score in results:
+        print(f"SIM:{score:3f}, {doc.metadata} {doc.page_content[:50]}")
 
-vectorStore=InMemoryVectorStore(embeddings)
-vectorStore.add_documents(docs)
-
-#for index,(id,doc) in enumerate(vectorStore.store.items()):
-#    print(f"{id}: {doc}")
-
-results=vectorStore.similarity_search_with_score(query="Tech Lead in London",k=5)
-print(len(results))
-for doc,score in results:
-    print(f"SIM:{score:3f}, {doc.metadata} {doc.page_content[:50]}")
\ No newline at end of file
+    print(f"query embedding cache {queryCache.stats()}")
+    if searchShards:
+        vectorStore.close()
@@ -1,69 +1,104 @@
-import datetime, json
+import os
+from collections import Counter
 from langchain_ollama import OllamaEmbeddings
-from langchain_redis import RedisVectorStore
-from langchain_community.document_loaders import DirectoryLoader, JSONLoader
-from langchain_core.documents import Document
 from redis import Redis
-from bs4 import BeautifulSoup
+from jobsearch.corpus import JobCorpus
+from jobsearch.normalize import NormalizedCache
+from jobsearch.embeddings import CachedEmbeddings, ConcurrentEmbeddings
+from jobsearch.projection import ProjectedEmbeddings, loadOrFitProjection
+from jobsearch.chunking import JobChunker
+from jobsearch.dedup import NearDuplicateDetector, dedupDocuments
+from jobsearch.keywords import KeywordIndex, indexKeywords
+from jobsearch.ingest import pipeline, loadCorpus, buildDocuments, skipUnchanged, chunkDocuments, embedBatches, writeBatches
+from jobsearch.ingest import redisWriter, trackedWriter, evictExpired, ThroughputMeter
+from jobsearch.ingeststate import IngestState
+from jobsearch.redisindex import jobVectorStore, indexArgsFromEnv
 
-def parseHTMLContent(html:str) -> str:
-    soup=BeautifulSoup(html)
-    return soup.get_text()
+# the html normalization runs on a process pool, which imports this script again
+# with the spawn start method (macOS, Windows), so it only runs as the main module
+if __name__ == "__main__":
+    # document embeddings are cached on disk by model and content hash,
+    # re-ingesting unchanged jobs does not call the model again, the cache misses
+    # of each ingest batch (INGEST_BATCH_SIZE) are one ollama request, up to 4 in flight
+    cache=CachedEmbeddings(
+        ConcurrentEmbeddings(OllamaEmbeddings(model="llama3.2"),maxInFlight=4,batchSize=8),
+        "reed.co.uk/embeddings.db")
 
-embeddings=OllamaEmbeddings(model="llama3.2")
+    # PCA_DIM=256 projects the embeddings onto their top 256 principal directions,
+    # fitted once on a sample of the cached embeddings and saved for the search
+    # scripts. the projected vectors go into their own index, jobs-pca256
+    pcaDim=int(os.environ.get("PCA_DIM","0"))
+    if pcaDim:
+        projection=loadOrFitProjection(f"reed.co.uk/pca-{pcaDim}.npz",pcaDim,lambda: cache.sample(20000))
+        embeddings=ProjectedEmbeddings(cache,projection)
+    else:
+        embeddings=cache
 
-redisClient=Redis.from_url("redis://localhost:6379")
+    redisClient=Redis.from_url("redis://localhost:6379")
 
-# Reference for RedisVectorStore from langchain
-# https://python.langchain.com/docs/integrations/vectorstores/redis/
-# https://python.langchain.com/api_reference/redis/vectorstores/langchain_redis.vectorstores.RedisVectorStore.html
-# https://api.python.langchain.com/en/latest/community/vectorstores/langchain_community.vectorstores.redis.base.Redis.html
+    # Reference for RedisVectorStore from langchain
+    # https://python.langchain.com/docs/integrations/vectorstores/redis/
+    # https://python.langchain.com/api_reference/redis/vectorstores/langchain_redis.vectorstores.RedisVectorStore.html
+    # https://api.python.langchain.com/en/latest/community/vectorstores/langchain_community.vectorstores.redis.base.Redis.html
 
-vectorStore=RedisVectorStore(
-    index_name='jobs',
-    embeddings=embeddings,
-    redis_client=redisClient
-)
+    # declarative job index (jobsearch.redisindex): HNSW or FLAT with the HNSW_* parameters
+    # from the environment and TAG/NUMERIC metadata fields for filtered KNN queries.
+    # REDIS_RECREATE_INDEX=1 re-creates the index with the current schema, keeping the stored jobs
+    vectorStore=jobVectorStore(
+        embeddings,
+        redisClient,
+        indexName=f'jobs-pca{pcaDim}' if pcaDim else 'jobs',
+        recreate=os.environ.get("REDIS_RECREATE_INDEX","0") == "1",
+        **indexArgsFromEnv())
 
-loader=DirectoryLoader(
-    "reed.co.uk/job-details",
-    glob="*.json",
-    sample_size=5,
-    randomize_sample=True,
-    show_progress=True,
-    loader_cls=JSONLoader,
-    loader_kwargs={
-        'jq_schema':'.',
-        'text_content':False,
-    },
-)
-jsonFiles=loader.load()
+    # INGEST_BATCH_SIZE documents are embedded with one embed_documents call and
+    # written with one redis pipeline, INGEST_SAMPLE_SIZE=0 ingests the whole corpus
+    batchSize=int(os.environ.get("INGEST_BATCH_SIZE","32"))
+    sampleSize=int(os.environ.get("INGEST_SAMPLE_SIZE","5")) or None
 
-for i in range(len(jsonFiles)):
-    job=json.loads(jsonFiles[i].page_content)
-    metadata={
-        'employerId':job['employerId'],
-        'jobId':job['jobId'],
-        'jobUrl':job['jobUrl'],
-        #'externalUrl':job['externalUrl'],
-        **jsonFiles[i].metadata
-    }
-    pageContent=f"""
-        Company: {job['employerName']}
-        Location: {job['locationName']}
-        Job Title: {job['jobTitle']}
-        Post Date: {job['datePosted']}
-        Exp Date: {job['expirationDate']}        
-        Job Description:```
-        {parseHTMLContent(job['jobDescription'])}
-        ```
-    """
-    doc=Document(page_content=pageContent,metadata=metadata)
-    print(f"[{datetime.datetime.now()}] {i+1}. add document {jsonFiles[i].metadata['source']} into Redis vector store...")
-    #print(doc.id)
-    #print(doc.page_content)
-    #print(doc.metadata)
-    ids=vectorStore.add_documents([doc])
-    #ids=vectorStore.add_texts([pageContent],metadatas=[metadata],ids=[job['jobId']])
-    print(ids[0])
+    jobDetails=JobCorpus("reed.co.uk/corpus/job-details")
+    # html descriptions converted by 22-reed.co.uk-normalize.py are read from its cache,
+    # the rest are parsed on a process pool and added to it
+    normalizedCache=NormalizedCache("reed.co.uk/normalized.db")
+    chunker=JobChunker(chunkSize=256,chunkOverlap=32)
+    # reposts and cross-posts of the same role are skipped before embedding
+    detector=NearDuplicateDetector(threshold=0.8)
 
+    # BM25 index of the whole job texts for hybrid search, updated incrementally across runs
+    keywordIndexDir="reed.co.uk/keyword-index"
+    keywordIndex=KeywordIndex.load(keywordIndexDir) if os.path.exists(keywordIndexDir) else KeywordIndex()
+
+    def onDuplicate(doc,canonical):
+        print(f"skip job {doc.metadata['jobId']}, near-duplicate of {canonical}")
+
+    # jobs are upserted by jobId (chunk keys "{jobId}-{i}"), jobs already written
+    # with the same content are skipped, every key expires with its job's
+    # expirationDate and expired jobs left in the state are evicted up front
+    state=IngestState("reed.co.uk/ingest-state.db",indexName=vectorStore.config.index_name)
+    print(f"evicted {evictExpired(state,vectorStore,keywordIndex)} expired jobs")
+    skipped=Counter()
+
+    def onSkip(doc,reason):
+        skipped[reason]+=1
+
+    # load -> normalize/build -> chunk -> embed -> write, each stage in its own
+    # thread with bounded queues in between, only a few batches are in memory
+    meter=ThroughputMeter("docs")
+    for ids in pipeline(
+        loadCorpus(jobDetails,sampleSize=sampleSize),
+        buildDocuments(cache=normalizedCache),
+        dedupDocuments(detector,onDuplicate),
+        skipUnchanged(state,onSkip),
+        indexKeywords(keywordIndex),
+        chunkDocuments(chunker),
+        embedBatches(embeddings,batchSize=batchSize),
+        writeBatches(trackedWriter(redisWriter(vectorStore),vectorStore,state)),
+    ):
+        meter.update(len(ids))
+
+    meter.report()
+    keywordIndex.save(keywordIndexDir)
+    print(f"{len(keywordIndex)} jobs in the keyword index")
+    print(f"skipped {len(detector.duplicates)} near-duplicate jobs, {skipped['unchanged']} unchanged, {skipped['expired']} expired")
+    print(f"{len(state)} live jobs in the index")
+    print(f"embedding cache hits:{cache.hits}, misses:{cache.misses}")
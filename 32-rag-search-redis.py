@@ -1,19 +1,33 @@
+import os
 from langchain_ollama import OllamaEmbeddings
-from langchain_redis import RedisVectorStore
 from redis import Redis
+from jobsearch.chunking import collapseChunks
+from jobsearch.embeddings import QueryCachedEmbeddings
+from jobsearch.keywords import KeywordIndex, fuseResults
+from jobsearch.projection import ProjectedEmbeddings, loadOrFitProjection
+from jobsearch.redisindex import jobVectorStore, indexArgsFromEnv, redisFilter
+from jobsearch.vectorstore import mmrResults
 
-embeddings=OllamaEmbeddings(model="llama3.2")
+# the same query is embedded by every search below, only the first one calls ollama
+queryCache=QueryCachedEmbeddings(OllamaEmbeddings(model="llama3.2"),maxsize=1024,ttl=3600)
+embeddings=queryCache
+
+# PCA_DIM must match the ingest, queries are projected with the projection fitted there
+pcaDim=int(os.environ.get("PCA_DIM","0"))
+if pcaDim:
+    embeddings=ProjectedEmbeddings(embeddings,loadOrFitProjection(f"reed.co.uk/pca-{pcaDim}.npz",pcaDim))
 
 redisClient=Redis.from_url("redis://localhost:6379")
 
 # Reference for RedisVectorStore from langchain
 # https://python.langchain.com/api_reference/redis/vectorstores/langchain_redis.vectorstores.RedisVectorStore.html
 # https://python.langchain.com/docs/integrations/vectorstores/redis/
-vectorStore=RedisVectorStore(
-    index_name='jobs',
-    embeddings=embeddings,
-    redis_client=redisClient
-)
+# same declarative job index as 31-rag-ingest-redis.py
+vectorStore=jobVectorStore(
+    embeddings,
+    redisClient,
+    indexName=f'jobs-pca{pcaDim}' if pcaDim else 'jobs',
+    **indexArgsFromEnv())
 
 #print(vectorStore.get_by_ids(['01JQEZT66N4XKDA9S1D9Y21F03'])[0])
 
@@ -28,17 +42,54 @@ query="Tech Lead role in London"
 #    print(doc.metadata)
 #    print(f"SIM:{score:3f}, {doc.metadata} {doc.page_content[:500]}")
 
-results=vectorStore.search(query,search_type='similarity',return_all=True)
+# the indexed metadata fields come back with the hits, no return_all round trips
+results=vectorStore.search(query,search_type='similarity')
+# jobs are stored as chunks, keep the best chunk of each job
+results=collapseChunks(results)
 print(len(results))
 for doc in results:
     print(doc.metadata)
     print(f"{doc.metadata} {doc.page_content[:500]}")
 
+# one filtered KNN query, redis applies the candidate expectations while searching
+results=vectorStore.similarity_search_with_score("Tech Lead",k=20,filter=redisFilter({
+    'locationName':'London',
+    'fullTime':True,
+    'salary':(45000,55000),
+}))
+for doc,distance in collapseChunks(results,k=5):
+    print(f"DIST:{distance:3f}, {doc.metadata.get('jobId')} {doc.metadata.get('jobTitle')} {doc.metadata.get('minimumSalary')}-{doc.metadata.get('maximumSalary')}")
+
+# hybrid search, BM25 over the job texts written by 31-rag-ingest-redis.py
+# fused with the dense hits by reciprocal rank, exact skills like Kubernetes
+# are found even when the embedding misses them
+keywordIndexDir="reed.co.uk/keyword-index"
+dense=vectorStore.similarity_search_with_score(query,k=20)
+if os.path.exists(keywordIndexDir):
+    keywordIndex=KeywordIndex.load(keywordIndexDir)
+    sparse=keywordIndex.search(query,k=20)
+    for doc,score in fuseResults([dense,sparse],k=5,method="rrf"):
+        print(f"RRF:{score:4f}, {doc.metadata.get('jobId')} {doc.metadata.get('jobTitle')}")
+    # score fusion needs the direction of each list, redis returns cosine distances
+    for doc,score in fuseResults([dense,sparse],k=5,method="weighted",weights=[0.7,0.3],higherIsBetter=[False,True]):
+        print(f"FUSED:{score:4f}, {doc.metadata.get('jobId')} {doc.metadata.get('jobTitle')}")
+
+    # pure keyword queries do not call the embedding model at all
+    for doc,score in keywordIndex.search("Kubernetes Spring",k=5):
+        print(f"BM25:{score:3f}, {doc.metadata.get('jobId')} {doc.metadata.get('jobTitle')}")
+else:
+    print(f"no keyword index in {keywordIndexDir}, run 31-rag-ingest-redis.py for hybrid search, dense hits only")
+    for doc,distance in collapseChunks(dense,k=5):
+        print(f"DIST:{distance:3f}, {doc.metadata.get('jobId')} {doc.metadata.get('jobTitle')}")
 
-retriever=vectorStore.as_retriever(
-    search_type="mmr",
-    search_kwargs={"k":1,"fetch_k":5,"lambda_mult":0.5,"return_all":True}
-)
-results=retriever.get_relevant_documents(query=query)
+
+# diverse job list with MMR: one KNN query returning the candidate vectors with
+# the hits, the diversity is computed locally in one numpy pass
+queryVector=embeddings.embed_query(query)
+candidates=vectorStore.similarity_search_with_score_by_vector(queryVector,k=100,with_vectors=True)
+results=mmrResults(queryVector,candidates,k=5,lambdaMult=0.5)
 print(len(results))
-print(results[0])
\ No newline at end of file
+for doc in results:
+    print(f"{doc.metadata.get('jobId')} {doc.page_content[:100]}")
+
+print(f"query embedding cache {queryCache.stats()}")
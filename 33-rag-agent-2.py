@@ -1,15 +1,16 @@
-import json
 import operator
 from typing import TypedDict, Annotated, Optional
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_ollama import ChatOllama
 from langchain_core.messages import AnyMessage
 from langchain_core.tools import tool
+from jobsearch.toolcalls import ToolExecutor, invokeToolCalls
 from langgraph.graph import StateGraph, START, END
 from langchain_core.documents import Document
 from pydantic import BaseModel, Field
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain.output_parsers import OutputFixingParser
+from jobsearch.repository import JsonFileRepository
 
 system="""
 <role>
@@ -103,12 +104,13 @@ Candidate expectation:
 {expectations}
 """
 
+# parsed once, reloaded when the file changes
+candidateProfiles = JsonFileRepository('data/cand_{id}.json',prewarm=True)
+
 @tool
 def getCandidateProfile(id: str) -> dict[str,any]:
     """Get Candidate Profile by ID"""
-    with open('data/cand_'+id+'.json','r') as file:
-        data = json.load(file)
-    return data #json.dump(data)
+    return candidateProfiles.get(id)
 
 @tool
 def searchJobs(
@@ -204,6 +206,8 @@ class Agent:
             "getCandidateProfile":getCandidateProfile,
             "searchJobs":searchJobs
         }
+        # searchJobs hits the vector store, at most 2 concurrent queries
+        self.toolExecutor=ToolExecutor(limits={'searchJobs':2},timeout=30)
 
         self.model=ChatOllama(
             model="llama3.2",
@@ -238,20 +242,18 @@ class Agent:
     
     def toolsNode(self, state:AgentState) -> AgentState:
         lastAIMsg = state['msg'][-1]
-        toolMsgs = []
+        toolCalls = []
         for t in lastAIMsg.tool_calls:
             if t['name'] in self.tools.keys():
-                try:
-                    # print(t)
-                    tool = self.tools[t['name']]
-                    toolMsg = tool.invoke(t)
-                    # print(toolMsg)
-                    toolMsgs.append(toolMsg)
-                except:
-                    print(lastAIMsg)
-                    raise
+                toolCalls.append(t)
             else:
                 print(f"Cannot find tools {t['name']} from the tools dict")
+        try:
+            # the calls of one turn run concurrently, e.g. several searchJobs queries
+            toolMsgs = invokeToolCalls(self.toolExecutor,self.tools,toolCalls)
+        except:
+            print(lastAIMsg)
+            raise
         return {'msg': toolMsgs}
     
     def outputNode(self, state:AgentState) -> AgentState:
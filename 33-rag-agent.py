@@ -1,4 +1,3 @@
-import json
 import operator
 from typing import TypedDict, Annotated
 from langchain_core.prompts import ChatPromptTemplate
@@ -8,6 +7,7 @@ from langchain_core.tools import tool
 from langgraph.graph import StateGraph, START, END
 from langchain_core.documents import Document
 from pydantic import BaseModel, Field
+from jobsearch.repository import JsonFileRepository
 
 system="""
 You are an agent try to solve a given problem.
@@ -74,12 +74,13 @@ prompt="""
 The candidate profile Id is {candidateId}
 """
 
+# parsed once, reloaded when the file changes
+candidateProfiles = JsonFileRepository('data/cand_{id}.json',prewarm=True)
+
 @tool
 def getCandidateProfile(id: str) -> dict[str,any]:
     """Get Candidate Profile by ID"""
-    with open('data/cand_'+id+'.json','r') as file:
-        data = json.load(file)
-    return data #json.dump(data)
+    return candidateProfiles.get(id)
 
 class SearchJobOpeningInput(BaseModel):
     question: str = Field(description="question for job openings search")
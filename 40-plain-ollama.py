@@ -1,8 +1,10 @@
-import json
 from ollama import chat, embed
 from ollama import ChatResponse
 from pydantic import BaseModel, Field
-from bs4 import BeautifulSoup
+from jobsearch.normalize import NormalizedCache
+from jobsearch.corpus import JobCorpus
+from jobsearch.repository import CorpusRepository
+from jobsearch.toolcalls import ToolExecutor
 
 class RoleRequirement(BaseModel):
     education: list[str] = Field(description="Minimum education requirement")
@@ -41,18 +43,19 @@ outputAgentSystemInstruction = f"""
 format the text input into given JSON Schema
 """
 
+jobDetails = JobCorpus("reed.co.uk/corpus/job-details")
+
+# normalized jobs by jobId, from the normalized cache shared with the ingest scripts,
+# the html is only parsed again when the job is re-crawled
+normalizedCache = NormalizedCache("reed.co.uk/normalized.db")
+jobDescriptions = CorpusRepository(jobDetails,transform=normalizedCache.normalize)
+
 def getJobDescription(jobId: str) -> dict[str,any]:
     """Get Job Description by jobId"""
     #print(f"getJobDescription:{jobId}")
-    with open(f"reed.co.uk/job-details/job_{jobId}.json",'r') as file:
-        data = json.load(file)
-
-    if data['salary']:
-        salary=BeautifulSoup(data['salary'],features="lxml")
-        data['salary']=salary.get_text()
-
-    jobDesc=BeautifulSoup(data['jobDescription'],features="lxml")
-    data['jobDescription']=jobDesc.get_text()
+    data = jobDescriptions.get(jobId)
+    if data is None:
+        return {'error':f"job {jobId} not found"}
 
     return data
 
@@ -74,6 +77,9 @@ get_job_description = {
     }
 }
 
+# shared by all ToolAgents, tool calls of one turn run concurrently
+toolExecutor = ToolExecutor(timeout=30)
+
 class ToolAgent:
     def __init__(self):
         self._messages = [
@@ -83,6 +89,7 @@ class ToolAgent:
         self.toolsMap = {
             'get_job_description': getJobDescription
         }
+        self.toolExecutor = toolExecutor
     
     def invoke(self, jobId: str):
         self._messages.append({'role':'user','content':f'jobId={jobId}'})
@@ -105,16 +112,20 @@ class ToolAgent:
             haveToolCall=False
             message=response['message']
             if message.tool_calls:
+                calls=[]
                 for toolcall in message.tool_calls:
                     if tool := self.toolsMap.get(toolcall.function.name):
                         #print(toolcall.function.name)
                         #print(toolcall.function.arguments)
-                        output = tool(**toolcall.function.arguments)
-                        #print(output)
-                        self._messages.append({'role':'tool','content':str(output),'name':toolcall.function.name})
-                        haveToolCall=True
+                        calls.append((toolcall.function.name,lambda tool=tool,args=toolcall.function.arguments: tool(**args)))
                     else:
                         print(f"function not found:{toolcall.function.name}")
+                # run the calls of this turn concurrently, the tool messages keep the call order
+                outputs=self.toolExecutor.run(calls,onTimeout=lambda i: {'error':f"{calls[i][0]} timed out"})
+                for (name,_),output in zip(calls,outputs):
+                    #print(output)
+                    self._messages.append({'role':'tool','content':str(output),'name':name})
+                    haveToolCall=True
         
         return response
 
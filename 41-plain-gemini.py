@@ -1,23 +1,26 @@
 import os, getpass, json
-from bs4 import BeautifulSoup
+from jobsearch.normalize import NormalizedCache
+from jobsearch.corpus import JobCorpus
+from jobsearch.repository import CorpusRepository
 from pydantic import BaseModel, Field
 from google import genai
 from google.genai import types
 
 # Reference: https://ai.google.dev/gemini-api/docs/text-generation
 
+jobDetails = JobCorpus("reed.co.uk/corpus/job-details")
+
+# normalized jobs by jobId, from the normalized cache shared with the ingest scripts,
+# the html is only parsed again when the job is re-crawled
+normalizedCache = NormalizedCache("reed.co.uk/normalized.db")
+jobDescriptions = CorpusRepository(jobDetails,transform=normalizedCache.normalize)
+
 def getJobDescription(jobId: str) -> dict[str,any]:
     """Get Job Description by jobId"""
     #print(f"getJobDescription:{jobId}")
-    with open(f"reed.co.uk/job-details/job_{jobId}.json",'r') as file:
-        data = json.load(file)
-
-    if data['salary']:
-        salary=BeautifulSoup(data['salary'],features="lxml")
-        data['salary']=salary.get_text()
-
-    jobDesc=BeautifulSoup(data['jobDescription'],features="lxml")
-    data['jobDescription']=jobDesc.get_text()
+    data = jobDescriptions.get(jobId)
+    if data is None:
+        return {'error':f"job {jobId} not found"}
 
     return data
 
@@ -2,12 +2,16 @@ import logging
 import time
 from fastapi import FastAPI
 from fastapi.responses import StreamingResponse
-from langchain_ollama import ChatOllama
+from langchain_ollama import ChatOllama, OllamaEmbeddings
+from jobsearch.embeddings import ConcurrentEmbeddings
 from pydantic import BaseModel 
 
 class ChatRequest(BaseModel):
     question: str
 
+class EmbedRequest(BaseModel):
+    texts: list[str]
+
 logger = logging.getLogger(__name__)
 app = FastAPI()
 
@@ -16,6 +20,12 @@ model = ChatOllama(
     temperature="0.5",
 )
 
+embeddings = ConcurrentEmbeddings(
+    OllamaEmbeddings(model="llama3.2"),
+    maxInFlight=4,
+    batchSize=8,
+)
+
 @app.get("/echo/")
 async def echo(name:str):
     return f"Hello {name}"
@@ -70,3 +80,7 @@ async def chat_ainvoke(request:ChatRequest):
         ("user",request.question)
     ])
     return response
+
+@app.post("/embed/")
+async def embed(request:EmbedRequest):
+    return await embeddings.aembed_documents(request.texts)
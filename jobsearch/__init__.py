@@ -0,0 +1 @@
+"""Shared building blocks for the reed.co.uk job search spike scripts"""
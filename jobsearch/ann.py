@@ -0,0 +1,145 @@
+import json, os
+from typing import Optional
+import numpy as np
+
+def nearestCentroids(vectors:np.ndarray, centroids:np.ndarray, spherical:bool=True) -> np.ndarray:
+    """Index of the nearest centroid of each vector, by cosine or by euclidean distance"""
+    scores=np.asarray(vectors,dtype=np.float32) @ centroids.T
+    if not spherical:
+        # argmin |x-c|^2 == argmax x.c - |c|^2/2
+        scores-=0.5*np.einsum("ij,ij->i",centroids,centroids)
+    return np.argmax(scores,axis=-1).astype(np.int32)
+
+def kmeans(vectors:np.ndarray, k:int, iterations:int=10, seed:int=1, spherical:bool=True) -> np.ndarray:
+    """
+    k-means returning k centroids. Spherical k-means over L2-normalized rows
+    gives normalized centroids, otherwise plain euclidean k-means.
+    """
+    rng=np.random.default_rng(seed)
+    vectors=np.asarray(vectors,dtype=np.float32)
+    centroids=vectors[rng.choice(len(vectors),size=k,replace=len(vectors) < k)].copy()
+    for _ in range(iterations):
+        labels=nearestCentroids(vectors,centroids,spherical)
+        # sum the vectors of each cluster in one pass over the sorted labels
+        order=np.argsort(labels,kind="stable")
+        counts=np.bincount(labels,minlength=k)
+        starts=np.concatenate(([0],np.cumsum(counts)[:-1]))
+        sums=np.zeros_like(centroids)
+        nonEmpty=counts > 0
+        sums[nonEmpty]=np.add.reduceat(vectors[order],starts[nonEmpty],axis=0)
+        # an empty cluster restarts from a random vector
+        empty=counts == 0
+        sums[empty]=vectors[rng.choice(len(vectors),size=int(empty.sum()))]
+        if spherical:
+            norms=np.linalg.norm(sums,axis=1,keepdims=True)
+            norms[norms == 0]=1.0
+            centroids=sums/norms
+        else:
+            centroids=sums/np.maximum(counts,1)[:,None]
+    return centroids
+
+class IVFIndex:
+    """
+    Inverted file index over the rows of a MatrixVectorStore.
+
+    k-means splits the vectors into `nlist` clusters, every row is assigned
+    to its nearest centroid. A query only scores the rows of its `nprobe`
+    nearest clusters, so raising nprobe trades latency for recall. The index
+    stores row numbers, not vectors, the scoring happens on the store's
+    matrix. New rows are assigned incrementally, the centroids stay as
+    trained, re-train after the corpus has changed a lot.
+    """
+    def __init__(self, centroids:np.ndarray, nprobe:int=8):
+        self.centroids=np.asarray(centroids,dtype=np.float32)
+        self.nprobe=nprobe
+        self._assign=np.empty(0,dtype=np.int32)
+        self._size=0
+        self._order=None
+        self._bounds=None
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def train(cls,
+        vectors:np.ndarray,
+        nlist:Optional[int]=None,
+        nprobe:int=8,
+        sampleSize:Optional[int]=None,
+        iterations:int=10,
+        seed:int=1) -> "IVFIndex":
+        """Train the centroids on (a sample of) `vectors` and assign all of them"""
+        vectors=np.asarray(vectors,dtype=np.float32)
+        nlist=min(nlist or max(1,int(np.sqrt(len(vectors)))),len(vectors))
+        # ~64 vectors per cluster are plenty to place the centroids
+        sampleSize=min(sampleSize or 64*nlist,len(vectors))
+        sample=vectors[np.random.default_rng(seed).choice(len(vectors),size=sampleSize,replace=False)]
+        index=cls(kmeans(sample,nlist,iterations,seed),nprobe)
+        index.append(vectors)
+        return index
+
+    def __len__(self) -> int:
+        return self._size
+
+    def assign(self, vectors:np.ndarray) -> np.ndarray:
+        """Nearest centroid of each vector"""
+        return nearestCentroids(vectors,self.centroids)
+
+    def append(self, vectors:np.ndarray) -> None:
+        """Assign the vectors of new rows, appended after the existing rows"""
+        labels=self.assign(vectors)
+        if self._size+len(labels) > len(self._assign):
+            grown=np.empty(max(2*len(self._assign),self._size+len(labels)),dtype=np.int32)
+            grown[:self._size]=self._assign[:self._size]
+            self._assign=grown
+        self._assign[self._size:self._size+len(labels)]=labels
+        self._size+=len(labels)
+        self._order=None
+
+    def update(self, row:int, vector:np.ndarray) -> None:
+        self._assign[row]=self.assign(vector)
+        self._order=None
+
+    def move(self, src:int, dst:int) -> None:
+        """Row `src` was moved to `dst` by the store"""
+        self._assign[dst]=self._assign[src]
+        self._order=None
+
+    def truncate(self, size:int) -> None:
+        self._size=size
+        self._order=None
+
+    def _lists(self) -> tuple[np.ndarray,np.ndarray]:
+        # rows grouped by cluster, rebuilt lazily after any change
+        if self._order is None:
+            assign=self._assign[:self._size]
+            self._order=np.argsort(assign,kind="stable").astype(np.int64)
+            self._bounds=np.searchsorted(assign[self._order],np.arange(self.nlist+1))
+        return self._order,self._bounds
+
+    def candidates(self, vectors:np.ndarray, nprobe:Optional[int]=None) -> list[np.ndarray]:
+        """Rows in the `nprobe` nearest clusters of each query vector"""
+        nprobe=min(nprobe or self.nprobe,self.nlist)
+        order,bounds=self._lists()
+        probes=np.argpartition(-(np.asarray(vectors,dtype=np.float32) @ self.centroids.T),nprobe-1,axis=-1)[...,:nprobe]
+        return [
+            np.concatenate([order[bounds[c]:bounds[c+1]] for c in clusters])
+            for clusters in probes
+        ]
+
+    def save(self, path:str) -> None:
+        os.makedirs(path,exist_ok=True)
+        np.save(os.path.join(path,"ivf-centroids.npy"),self.centroids)
+        np.save(os.path.join(path,"ivf-assign.npy"),self._assign[:self._size])
+        with open(os.path.join(path,"ivf.json"),"w") as file:
+            json.dump({'nlist':self.nlist,'nprobe':self.nprobe,'count':self._size},file)
+
+    @classmethod
+    def load(cls, path:str) -> "IVFIndex":
+        with open(os.path.join(path,"ivf.json"),"r") as file:
+            info=json.load(file)
+        index=cls(np.load(os.path.join(path,"ivf-centroids.npy")),info['nprobe'])
+        index._assign=np.load(os.path.join(path,"ivf-assign.npy"))
+        index._size=len(index._assign)
+        return index
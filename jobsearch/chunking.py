@@ -0,0 +1,63 @@
+from typing import Callable, Iterable, Optional
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+def tiktokenLength(encodingName:str="cl100k_base") -> Callable[[str],int]:
+    """Token counter of a tiktoken encoding, close enough to the llama tokenizer for sizing chunks"""
+    import tiktoken
+    encoding=tiktoken.get_encoding(encodingName)
+    def length(text:str) -> int:
+        return len(encoding.encode(text,disallowed_special=()))
+    return length
+
+class JobChunker:
+    """
+    Split job documents into overlapping chunks of at most `chunkSize` tokens.
+
+    Every chunk keeps the metadata of its job, the parent jobId is in
+    metadata['jobId'], plus chunkIndex/chunkCount. Chunk ids are
+    "{jobId}-{chunkIndex}". Used as the splitter of the ingest chunk stage.
+    """
+    def __init__(self,
+        chunkSize:int=256,
+        chunkOverlap:int=32,
+        lengthFunction:Optional[Callable[[str],int]]=None):
+        self.splitter=RecursiveCharacterTextSplitter(
+            chunk_size=chunkSize,
+            chunk_overlap=chunkOverlap,
+            length_function=lengthFunction or tiktokenLength(),
+            separators=["\n\n","\n",". "," ",""],
+        )
+
+    def __call__(self, doc:Document) -> list[Document]:
+        # a job with no text still gets one (empty) chunk so it is not lost
+        texts=self.splitter.split_text(doc.page_content) or [doc.page_content]
+        jobId=doc.metadata.get('jobId',doc.id)
+        return [
+            Document(
+                id=f"{jobId}-{i}",
+                page_content=text,
+                metadata={**doc.metadata,'jobId':jobId,'chunkIndex':i,'chunkCount':len(texts)})
+            for i,text in enumerate(texts)
+        ]
+
+def collapseChunks(results:Iterable, k:Optional[int]=None) -> list:
+    """
+    Collapse chunk hits back to one hit per job.
+
+    `results` are Documents or (Document, score) tuples ordered best first,
+    as returned by the vector store searches, the first (best) chunk of each
+    jobId is kept. Returns at most `k` results in the same shape.
+    """
+    collapsed=[]
+    seen=set()
+    for result in results:
+        doc=result[0] if isinstance(result,tuple) else result
+        jobId=doc.metadata.get('jobId',doc.id)
+        if jobId in seen:
+            continue
+        seen.add(jobId)
+        collapsed.append(result)
+        if k is not None and len(collapsed) >= k:
+            break
+    return collapsed
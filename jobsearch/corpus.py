@@ -0,0 +1,274 @@
+import glob, json, os, re, sqlite3, threading
+from typing import Iterator, Optional
+
+SEGMENT_PATTERN=re.compile(r"segment-(\d+)\.jsonl$")
+
+class JobCorpus:
+    """
+    Append-only store of reed.co.uk json documents keyed by jobId.
+
+    Documents are appended as compact json lines to segment files
+    (segment-00001.jsonl, segment-00002.jsonl, ...). A new segment is started
+    once the active one grows past `segmentSize` bytes. The index maps each
+    jobId to (segment, offset, length) of its latest version. It is kept in
+    memory for lookups and persisted in a sqlite file next to the segments.
+
+    Putting the same jobId again appends a new line and repoints the index,
+    the old line stays in its segment until `compact()` rewrites the store
+    with live records only. The store assumes a single writer process, within
+    that process it can be shared between threads. Reader processes see the
+    writes of the writer after calling `refresh()`.
+    """
+    def __init__(self, path:str="reed.co.uk/corpus/job-details", segmentSize:int=64*1024*1024):
+        self.path=path
+        self.segmentSize=segmentSize
+        os.makedirs(path,exist_ok=True)
+
+        self._lock=threading.RLock()
+        self._conn=sqlite3.connect(os.path.join(path,"index.db"),check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS records (
+                jobId TEXT PRIMARY KEY,
+                segment INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            )
+        """)
+        self._loadIndex()
+        self._readers={}
+        self._pending=0
+
+        segments=self._segments()
+        self._activeSegment=segments[-1] if segments else 1
+        self._writer=open(self._segmentPath(self._activeSegment),"ab")
+        self._tailChecked=False
+
+    def _loadIndex(self) -> None:
+        # data_version changes whenever another connection commits to the db
+        self._dataVersion=self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._index={
+            jobId:(segment,offset,length)
+            for jobId,segment,offset,length in self._conn.execute("SELECT jobId,segment,offset,length FROM records")
+        }
+
+    def refresh(self) -> bool:
+        """
+        Reload the index if another process committed to the store since it
+        was loaded, e.g. a re-crawl or a compaction. Returns True if it did.
+        """
+        with self._lock:
+            if self._conn.execute("PRAGMA data_version").fetchone()[0] == self._dataVersion:
+                return False
+            self._loadIndex()
+            # a compaction removed the old segments, their open readers see stale files
+            for fd in self._readers.values():
+                os.close(fd)
+            self._readers={}
+            return True
+
+    @staticmethod
+    def _truncateTornLine(path:str) -> None:
+        # a crash during a write can leave a last line without its newline, appending
+        # after it would glue the next record onto it, so it is cut off (the index
+        # never points at it, lines are flushed before the index is committed)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return
+        with open(path,"r+b") as file:
+            end=file.seek(0,os.SEEK_END)
+            position=end
+            while position > 0:
+                start=max(0,position-65536)
+                file.seek(start)
+                block=file.read(position-start)
+                newline=block.rfind(b"\n")
+                if newline >= 0:
+                    position=start+newline+1
+                    break
+                position=start
+            if position < end:
+                print(f"truncating a torn line of {end-position} bytes at the end of {path}")
+                file.truncate(position)
+
+    def _segmentPath(self, segment:int) -> str:
+        return os.path.join(self.path,f"segment-{segment:05d}.jsonl")
+
+    def _segments(self) -> list[int]:
+        segments=[]
+        for file in glob.glob(os.path.join(self.path,"segment-*.jsonl")):
+            if match := SEGMENT_PATTERN.search(file):
+                segments.append(int(match.group(1)))
+        return sorted(segments)
+
+    def _reader(self, segment:int) -> int:
+        if segment not in self._readers:
+            self._readers[segment]=os.open(self._segmentPath(segment),os.O_RDONLY)
+        return self._readers[segment]
+
+    def _rollSegment(self) -> None:
+        self._writer.close()
+        self._activeSegment+=1
+        self._writer=open(self._segmentPath(self._activeSegment),"ab")
+
+    def put(self, jobId:str, doc:dict) -> None:
+        jobId=str(jobId)
+        line=json.dumps(doc,separators=(",",":"),ensure_ascii=False).encode("utf-8")+b"\n"
+        with self._lock:
+            self._append(jobId,line)
+
+    def _append(self, jobId:str, line:bytes) -> None:
+        if not self._tailChecked:
+            # on the first write only, readers must not touch a segment another process is writing
+            self._writer.close()
+            self._truncateTornLine(self._segmentPath(self._activeSegment))
+            self._writer=open(self._segmentPath(self._activeSegment),"ab")
+            self._tailChecked=True
+        if self._writer.tell() > 0 and self._writer.tell()+len(line) > self.segmentSize:
+            self._rollSegment()
+
+        offset=self._writer.tell()
+        self._writer.write(line)
+        self._index[jobId]=(self._activeSegment,offset,len(line))
+        self._conn.execute(
+            "INSERT OR REPLACE INTO records (jobId,segment,offset,length) VALUES (?,?,?,?)",
+            (jobId,self._activeSegment,offset,len(line)))
+
+        # the index only points at lines that are flushed to the segment,
+        # both are committed in batches to keep bulk loading cheap
+        self._pending+=1
+        if self._pending >= 1000:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._writer.flush()
+            self._conn.commit()
+            self._pending=0
+
+    def _read(self, location:tuple[int,int,int]) -> dict:
+        segment,offset,length=location
+        with self._lock:
+            if segment == self._activeSegment and self._pending:
+                self._writer.flush()
+            fd=self._reader(segment)
+        return json.loads(os.pread(fd,length,offset))
+
+    def get(self, jobId:str) -> Optional[dict]:
+        location=self._index.get(str(jobId))
+        if location is None:
+            return None
+        try:
+            return self._read(location)
+        except FileNotFoundError:
+            # the segment was compacted away by another process since the last refresh()
+            if not self.refresh():
+                raise
+            return self.get(jobId)
+
+    def location(self, jobId:str) -> Optional[tuple[int,int,int]]:
+        """(segment, offset, length) of the latest version of a job, changes whenever the job is put again"""
+        return self._index.get(str(jobId))
+
+    def delete(self, jobId:str) -> None:
+        with self._lock:
+            if self._index.pop(str(jobId),None):
+                self._conn.execute("DELETE FROM records WHERE jobId=?",(str(jobId),))
+                self._pending+=1
+
+    def __contains__(self, jobId:str) -> bool:
+        return str(jobId) in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def keys(self) -> list[str]:
+        return list(self._index.keys())
+
+    def scan(self) -> Iterator[tuple[str,dict]]:
+        """Stream (jobId, doc) of the live records, reading the segments sequentially"""
+        self.flush()
+        yield from self._scanSegments(self._segments())
+
+    def _scanSegments(self, segments:list[int]) -> Iterator[tuple[str,dict]]:
+        live={(segment,offset):jobId for jobId,(segment,offset,_) in self._index.items()}
+        for segment in segments:
+            with open(self._segmentPath(segment),"rb") as file:
+                offset=0
+                for line in file:
+                    if not line.endswith(b"\n"):
+                        # only the active segment of a store another process is writing to
+                        print(f"skipping a torn line of {len(line)} bytes at {offset} of segment {segment}")
+                        break
+                    if jobId := live.get((segment,offset)):
+                        yield jobId,json.loads(line)
+                    offset+=len(line)
+
+    def compact(self) -> None:
+        """Rewrite the live records into fresh segments and drop the stale ones"""
+        with self._lock:
+            self._compact()
+
+    def _compact(self) -> None:
+        self.flush()
+        oldSegments=self._segments()
+        # new segments are numbered after the old ones, so a crash half way
+        # leaves the old segments and the old index untouched
+        nextSegment=oldSegments[-1]+1 if oldSegments else 1
+        records=[]
+        writer=open(self._segmentPath(nextSegment),"wb")
+        for jobId,doc in self._scanSegments(oldSegments):
+            line=json.dumps(doc,separators=(",",":"),ensure_ascii=False).encode("utf-8")+b"\n"
+            if writer.tell() > 0 and writer.tell()+len(line) > self.segmentSize:
+                writer.close()
+                nextSegment+=1
+                writer=open(self._segmentPath(nextSegment),"wb")
+            records.append((jobId,nextSegment,writer.tell(),len(line)))
+            writer.write(line)
+        writer.close()
+
+        with self._conn:
+            self._conn.execute("DELETE FROM records")
+            self._conn.executemany("INSERT INTO records (jobId,segment,offset,length) VALUES (?,?,?,?)",records)
+
+        self._writer.close()
+        for fd in self._readers.values():
+            os.close(fd)
+        self._readers={}
+        for segment in oldSegments:
+            os.remove(self._segmentPath(segment))
+
+        self._index={jobId:(segment,offset,length) for jobId,segment,offset,length in records}
+        self._activeSegment=nextSegment
+        self._writer=open(self._segmentPath(self._activeSegment),"ab")
+
+    def close(self) -> None:
+        with self._lock:
+            self.flush()
+            self._writer.close()
+            for fd in self._readers.values():
+                os.close(fd)
+            self._readers={}
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def migrateDirectory(srcDir:str="reed.co.uk", corpusDir:str="reed.co.uk/corpus") -> dict[str,int]:
+    """One-off import of the search-results/ and job-details/ json files into corpus stores"""
+    counts={}
+    for collection,prefix in (("search-results","search-result_"),("job-details","job_")):
+        count=0
+        with JobCorpus(os.path.join(corpusDir,collection)) as corpus:
+            for file in sorted(glob.glob(os.path.join(srcDir,collection,f"{prefix}*.json"))):
+                with open(file,"r") as infile:
+                    doc=json.load(infile)
+                jobId=str(doc.get('jobId') or os.path.basename(file)[len(prefix):-len(".json")])
+                corpus.put(jobId,doc)
+                count+=1
+        print(f"migrated {count} files from {srcDir}/{collection}")
+        counts[collection]=count
+    return counts
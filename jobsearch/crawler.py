@@ -0,0 +1,232 @@
+import asyncio, json, random, time
+from typing import Callable, Optional
+import aiohttp
+from jobsearch.manifest import CrawlManifest
+
+# reed.co.uk api reference
+# https://www.reed.co.uk/developers/jobseeker
+
+REED_BASE_URL="https://www.reed.co.uk/api/1.0"
+
+# status codes worth another attempt, everything else is reported and skipped
+RETRY_STATUS={429,500,502,503,504}
+
+class TokenBucket:
+    """Rate limiter refilling `rate` tokens per second, holding at most `burst` tokens"""
+    def __init__(self, rate:float, burst:int=1):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be > 0 and burst must be >= 1")
+        self.rate=rate
+        self.burst=burst
+        self._tokens=float(burst)
+        self._updated=time.monotonic()
+        self._lock=asyncio.Lock()
+
+    def _refill(self) -> None:
+        now=time.monotonic()
+        self._tokens=min(self.burst,self._tokens+(now-self._updated)*self.rate)
+        self._updated=now
+
+    async def acquire(self) -> None:
+        # the lock keeps waiters in FIFO order, so a burst of callers are
+        # released one token at a time instead of all waking up together
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1-self._tokens)/self.rate)
+                self._refill()
+            self._tokens-=1
+
+class ReedCrawler:
+    """
+    Async crawler for the reed.co.uk jobseeker api.
+
+    Search paging and job detail fetching run concurrently over one pooled
+    keep-alive session: the search loop feeds jobIds into a bounded queue and
+    `concurrency` workers fetch the details. Every request, search or detail,
+    takes a token from the same bucket so the overall request rate never goes
+    above the api quota.
+
+    With a CrawlManifest the crawl is incremental and resumable: it starts
+    from the saved paging cursor, re-queues jobs left pending by a previous
+    run, and only stores search results and fetches details for jobs that
+    are new or whose search result changed since the last crawl.
+    onSearchResult and onJobDetail must have persisted their record when
+    they return, the manifest marks it as done right after. A job whose
+    fetch or onJobDetail fails is counted as failed and stays pending for
+    the next run.
+    """
+    def __init__(self,
+        apiKey:str,
+        baseUrl:str=REED_BASE_URL,
+        outputDir:str="reed.co.uk",
+        rate:float=2.0,
+        burst:int=10,
+        concurrency:int=8,
+        resultsToTake:int=100,
+        maxRetries:int=5,
+        backoff:float=1.0,
+        timeout:float=30.0,
+        onSearchResult:Optional[Callable[[dict],None]]=None,
+        onJobDetail:Optional[Callable[[str,dict],None]]=None,
+        manifest:Optional[CrawlManifest]=None):
+        self.apiKey=apiKey
+        self.baseUrl=baseUrl.rstrip("/")
+        self.outputDir=outputDir
+        self.limiter=TokenBucket(rate,burst)
+        self.concurrency=concurrency
+        self.resultsToTake=resultsToTake
+        self.maxRetries=maxRetries
+        self.backoff=backoff
+        self.timeout=timeout
+        self.onSearchResult=onSearchResult or self.saveSearchResult
+        self.onJobDetail=onJobDetail or self.saveJobDetail
+        self.manifest=manifest
+        self._queued=set()
+        self.stats={'requests':0,'retries':0,'failed':0,'jobs':0,'skipped':0,'unchanged':0}
+
+    def saveSearchResult(self, job:dict) -> None:
+        jobId=job['jobId']
+        with open(f"{self.outputDir}/search-results/search-result_{jobId}.json","w") as outfile:
+            outfile.write(json.dumps(job, indent=4))
+
+    def saveJobDetail(self, jobId:str, detail:dict) -> None:
+        with open(f"{self.outputDir}/job-details/job_{jobId}.json","w") as outfile:
+            print(f"saving file job_{jobId}.json")
+            outfile.write(json.dumps(detail, indent=4))
+
+    def _retryDelay(self, attempt:int, retryAfter:Optional[str]) -> float:
+        if retryAfter:
+            try:
+                return float(retryAfter)
+            except ValueError:
+                pass
+        # exponential backoff with jitter so the workers do not retry in lockstep
+        delay=self.backoff*(2**attempt)
+        return delay+random.uniform(0,delay/2)
+
+    async def _get(self, session:aiohttp.ClientSession, url:str, params:Optional[dict]=None) -> Optional[dict]:
+        for attempt in range(self.maxRetries+1):
+            await self.limiter.acquire()
+            self.stats['requests']+=1
+            retryAfter=None
+            try:
+                async with session.get(url,params=params) as response:
+                    if response.status == 200:
+                        return await response.json(content_type=None)
+                    if response.status not in RETRY_STATUS:
+                        print(f"GET {url} failed, status:{response.status}")
+                        self.stats['failed']+=1
+                        return None
+                    retryAfter=response.headers.get("Retry-After")
+                    print(f"GET {url} status:{response.status}, attempt:{attempt+1}")
+            except (aiohttp.ClientError,asyncio.TimeoutError) as e:
+                print(f"GET {url} error:{e!r}, attempt:{attempt+1}")
+
+            if attempt < self.maxRetries:
+                self.stats['retries']+=1
+                await asyncio.sleep(self._retryDelay(attempt,retryAfter))
+
+        print(f"GET {url} gave up after {self.maxRetries+1} attempts")
+        self.stats['failed']+=1
+        return None
+
+    async def _searchPages(self, session:aiohttp.ClientSession, queue:asyncio.Queue, keywords:str, location:str) -> None:
+        resultsToSkip=self.manifest.loadCursor(keywords,location) if self.manifest is not None else 0
+        page=resultsToSkip//self.resultsToTake+1
+        while True:
+            print(f"page:{page},resultsToSkip:{resultsToSkip}")
+            data=await self._get(session,f"{self.baseUrl}/search",params={
+                'keywords':keywords,
+                'locationName':location,
+                'resultsToTake':self.resultsToTake,
+                'resultsToSkip':resultsToSkip
+            })
+            if data is None:
+                return
+
+            results=data['results']
+            if not results:
+                if self.manifest is not None:
+                    self.manifest.clearCursor(keywords,location)
+                return
+
+            for job in results:
+                # unchanged results are not stored again, an append-only store would grow every run
+                if self.manifest is None or self.manifest.searchResultChanged(job):
+                    self.onSearchResult(job)
+                if self.manifest is not None and not self.manifest.recordSearchResult(job):
+                    self.stats['skipped']+=1
+                    continue
+                if str(job['jobId']) in self._queued:
+                    continue
+                self._queued.add(str(job['jobId']))
+                # blocks when the detail workers fall behind, which keeps the
+                # search loop from running far ahead of the fetched details
+                await queue.put(job['jobId'])
+
+            resultsToSkip=resultsToSkip+len(results)
+            page=page+1
+            if self.manifest is not None:
+                self.manifest.saveCursor(keywords,location,resultsToSkip)
+
+    async def _fetchDetail(self, session:aiohttp.ClientSession, jobId:str) -> None:
+        detail=await self._get(session,f"{self.baseUrl}/jobs/{jobId}")
+        if detail is None:
+            return
+        if self.manifest is not None and not self.manifest.detailChanged(jobId,detail):
+            self.stats['unchanged']+=1
+        else:
+            self.onJobDetail(str(jobId),detail)
+            self.stats['jobs']+=1
+        # the job stops being pending only after onJobDetail saved it,
+        # a crash in between fetches it again on the next run
+        if self.manifest is not None:
+            self.manifest.recordJobDetail(jobId,detail)
+
+    async def _detailWorker(self, session:aiohttp.ClientSession, queue:asyncio.Queue) -> None:
+        while True:
+            jobId=await queue.get()
+            try:
+                if jobId is None:
+                    return
+                await self._fetchDetail(session,jobId)
+            except Exception as e:
+                # e.g. a body that is not json or a failed write, the job stays
+                # pending in the manifest and is fetched again on the next run
+                print(f"job {jobId} failed, error:{e!r}")
+                self.stats['failed']+=1
+            finally:
+                queue.task_done()
+
+    async def crawl(self, keywords:str, location:str) -> dict:
+        """Crawl all search pages and job details, returns the request stats"""
+        start=time.monotonic()
+        queue=asyncio.Queue(maxsize=self.concurrency*2)
+        connector=aiohttp.TCPConnector(limit=self.concurrency+1,keepalive_timeout=30)
+        async with aiohttp.ClientSession(
+            auth=aiohttp.BasicAuth(self.apiKey,""),
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+
+            # a worker that dies cancels the search loop instead of leaving it
+            # blocked on the full queue, the error is raised out of the group
+            async with asyncio.TaskGroup() as tasks:
+                for _ in range(self.concurrency):
+                    tasks.create_task(self._detailWorker(session,queue))
+                if self.manifest is not None:
+                    # jobs queued but never fetched by an interrupted run
+                    pending=self.manifest.pendingJobIds()
+                    if pending:
+                        print(f"resuming {len(pending)} pending job details")
+                    for jobId in pending:
+                        self._queued.add(jobId)
+                        await queue.put(jobId)
+                await self._searchPages(session,queue,keywords,location)
+                for _ in range(self.concurrency):
+                    await queue.put(None)
+
+        elapsed=time.monotonic()-start
+        self.stats['elapsed']=elapsed
+        print(f"crawled {self.stats['jobs']} jobs in {elapsed:.1f}s, stats:{self.stats}")
+        return self.stats
@@ -0,0 +1,115 @@
+import re, zlib
+from typing import Callable, Iterator, Optional
+import numpy as np
+from langchain_core.documents import Document
+
+# Mersenne prime used by the universal hash functions of the MinHash
+MERSENNE_PRIME=np.uint64((1<<61)-1)
+MAX_HASH=np.uint64((1<<32)-1)
+
+TOKEN=re.compile(r"\w+")
+
+def shingles(text:str, size:int=5) -> np.ndarray:
+    """crc32 hashes of the word `size`-grams of a text"""
+    words=TOKEN.findall(text.lower())
+    if len(words) < size:
+        words=words+[""]*(size-len(words))
+    grams={" ".join(words[i:i+size]) for i in range(len(words)-size+1)}
+    return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams),dtype=np.uint64,count=len(grams))
+
+class MinHasher:
+    """MinHash signatures of `numPerm` universal hash functions, seeded so signatures are stable across runs"""
+    def __init__(self, numPerm:int=128, seed:int=1):
+        rng=np.random.RandomState(seed)
+        self.numPerm=numPerm
+        self._a=rng.randint(1,np.iinfo(np.int64).max,size=numPerm,dtype=np.int64).astype(np.uint64)
+        self._b=rng.randint(0,np.iinfo(np.int64).max,size=numPerm,dtype=np.int64).astype(np.uint64)
+
+    def signature(self, hashes:np.ndarray) -> np.ndarray:
+        # (numShingles, numPerm) matrix of permuted hashes, min over the shingles
+        permuted=(np.outer(hashes,self._a)+self._b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+class MinHashLSH:
+    """
+    LSH index over MinHash signatures.
+
+    The signature is cut into `bands` bands of numPerm/bands rows, two
+    signatures become candidates when any band matches exactly, so a query
+    only looks at the buckets of its own bands instead of every signature.
+    """
+    def __init__(self, numPerm:int=128, bands:int=16):
+        if numPerm % bands:
+            raise ValueError("numPerm must be a multiple of bands")
+        self.bands=bands
+        self.rows=numPerm//bands
+        self._buckets=[{} for _ in range(bands)]
+        self._signatures={}
+
+    def _bandKeys(self, signature:np.ndarray) -> list[bytes]:
+        return [signature[i*self.rows:(i+1)*self.rows].tobytes() for i in range(self.bands)]
+
+    def insert(self, key:str, signature:np.ndarray) -> None:
+        self._signatures[key]=signature
+        for bucket,bandKey in zip(self._buckets,self._bandKeys(signature)):
+            bucket.setdefault(bandKey,[]).append(key)
+
+    def query(self, signature:np.ndarray) -> set[str]:
+        candidates=set()
+        for bucket,bandKey in zip(self._buckets,self._bandKeys(signature)):
+            candidates.update(bucket.get(bandKey,()))
+        return candidates
+
+    def similarity(self, key:str, signature:np.ndarray) -> float:
+        """Estimated Jaccard similarity, the fraction of matching signature rows"""
+        return float(np.mean(self._signatures[key] == signature))
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+class NearDuplicateDetector:
+    """
+    Find near-duplicate job postings, e.g. reposts under a new jobId.
+
+    The first posting seen becomes the canonical one, a later posting whose
+    estimated Jaccard similarity to a canonical posting reaches `threshold`
+    is linked to it in `duplicates` (jobId -> canonical jobId).
+    """
+    def __init__(self, threshold:float=0.8, numPerm:int=128, bands:int=16, shingleSize:int=5):
+        self.threshold=threshold
+        self.shingleSize=shingleSize
+        self.hasher=MinHasher(numPerm)
+        self.lsh=MinHashLSH(numPerm,bands)
+        self.duplicates={}
+
+    def check(self, jobId:str, text:str) -> Optional[str]:
+        """Returns the canonical jobId if `text` is a near-duplicate, otherwise indexes it and returns None"""
+        jobId=str(jobId)
+        signature=self.hasher.signature(shingles(text,self.shingleSize))
+        best,bestScore=None,0.0
+        for candidate in self.lsh.query(signature):
+            if candidate == jobId:
+                continue
+            score=self.lsh.similarity(candidate,signature)
+            if score > bestScore:
+                best,bestScore=candidate,score
+
+        if best is not None and bestScore >= self.threshold:
+            self.duplicates[jobId]=best
+            return best
+        self.lsh.insert(jobId,signature)
+        return None
+
+def dedupDocuments(
+    detector:NearDuplicateDetector,
+    onDuplicate:Optional[Callable[[Document,str],None]]=None) -> Callable[[Iterator[Document]],Iterator[Document]]:
+    """Ingest stage dropping near-duplicate job documents before they are chunked and embedded"""
+    def stage(docs:Iterator[Document]) -> Iterator[Document]:
+        for doc in docs:
+            jobId=doc.metadata.get('jobId',doc.id)
+            canonical=detector.check(jobId,doc.page_content)
+            if canonical is None:
+                yield doc
+            elif onDuplicate is not None:
+                onDuplicate(doc,canonical)
+    return stage
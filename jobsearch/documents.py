@@ -0,0 +1,94 @@
+import json, os
+from collections import OrderedDict
+from typing import Iterable, Iterator
+from langchain_core.documents import Document
+from jobsearch.manifest import contentHash
+from jobsearch.normalize import htmlToText
+
+# reed job fields copied into the document metadata, fields missing from
+# the job or set to None are left out so every vector store accepts them
+METADATA_FIELDS=(
+    'jobId','employerId','employerName','jobTitle','locationName',
+    'minimumSalary','maximumSalary','datePosted','expirationDate',
+    'jobUrl','externalUrl','contractType','fullTime','partTime',
+)
+
+def jobMetadata(job:dict, **extra) -> dict:
+    """Canonical metadata of a reed job"""
+    metadata={field:job[field] for field in METADATA_FIELDS if job.get(field) is not None}
+    metadata['jobId']=str(job['jobId'])
+    metadata.update({key:value for key,value in extra.items() if value is not None})
+    return metadata
+
+def jobPageContent(job:dict, normalized:bool=False) -> str:
+    """Text embedded for a reed job, a normalized job (normalizeJob, normalizeCorpus) already has a text jobDescription"""
+    description=(job.get('jobDescription') or "") if normalized else htmlToText(job.get('jobDescription'))
+    return f"""
+        Company: {job['employerName']}
+        Location: {job['locationName']}
+        Job Title: {job['jobTitle']}
+        Post Date: {job['datePosted']}
+        Exp Date: {job['expirationDate']}
+        Job Description:```
+        {description}
+        ```
+    """
+
+def buildJobDocument(job:dict, normalized:bool=False, **extra) -> Document:
+    """Build the Document of a reed job dict, raw or normalized, `extra` is merged into the metadata"""
+    return Document(
+        id=str(job['jobId']),
+        page_content=jobPageContent(job,normalized),
+        metadata=jobMetadata(job,**extra))
+
+class JobDocumentBuilder:
+    """
+    Memoized buildJobDocument.
+
+    Documents built from a job dict are cached by the job's content hash,
+    documents built from a json file by its path and mtime, so a changed
+    job or a rewritten file is rebuilt. At most `maxsize` documents are
+    kept, the least recently used are dropped first, maxsize=0 builds every
+    document without caching (e.g. for a single ingest pass).
+    """
+    def __init__(self, maxsize:int=10000):
+        self.maxsize=maxsize
+        self._cache=OrderedDict()
+        self.hits=0
+        self.misses=0
+
+    def _cached(self, key, build) -> Document:
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.hits+=1
+            return self._cache[key]
+        self.misses+=1
+        doc=build()
+        if self.maxsize > 0:
+            self._cache[key]=doc
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return doc
+
+    def build(self, job:dict, normalized:bool=False, **extra) -> Document:
+        if self.maxsize <= 0:
+            # nothing is kept, skip hashing the job
+            self.misses+=1
+            return buildJobDocument(job,normalized,**extra)
+        key=(contentHash(job),normalized,tuple(sorted(extra.items())))
+        return self._cached(key,lambda: buildJobDocument(job,normalized,**extra))
+
+    def fromFile(self, path:str) -> Document:
+        def load() -> Document:
+            with open(path,"r") as file:
+                return buildJobDocument(json.load(file),source=path)
+        return self._cached((path,os.stat(path).st_mtime_ns),load)
+
+    def iterDocuments(self, jobs:Iterable[dict], normalized:bool=False, **extra) -> Iterator[Document]:
+        """Generator form of build(), one Document per job"""
+        for job in jobs:
+            yield self.build(job,normalized,**extra)
+
+    def iterFiles(self, paths:Iterable[str]) -> Iterator[Document]:
+        for path in paths:
+            yield self.fromFile(path)
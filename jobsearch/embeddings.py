@@ -0,0 +1,306 @@
+import asyncio, hashlib, sqlite3, threading, time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+def modelName(embeddings:Embeddings) -> str:
+    """
+    Name identifying the model of an Embeddings object, e.g. OllamaEmbeddings:llama3.2.
+    Wrappers handing back the model's vectors unchanged are skipped, so adding
+    or removing one (e.g. ConcurrentEmbeddings) keeps the cache keys.
+    """
+    while isinstance(embeddings,(CachedEmbeddings,QueryCachedEmbeddings,ConcurrentEmbeddings)):
+        embeddings=embeddings.embeddings
+    model=getattr(embeddings,'model',None) or getattr(embeddings,'model_name',None)
+    return f"{type(embeddings).__name__}:{model}" if model else type(embeddings).__name__
+
+def textHash(text:str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def normalizeQuery(text:str) -> str:
+    """Case and whitespace insensitive form of a query, "Tech  Lead " and "tech lead" share a cache entry"""
+    return " ".join(text.casefold().split())
+
+class CachedEmbeddings(Embeddings):
+    """
+    Persistent embedding cache in front of any langchain Embeddings.
+
+    Document embeddings are stored in sqlite as float32 blobs keyed by
+    (model name, sha256 of the text), so re-embedding an unchanged text with
+    the same model is a lookup instead of a model call. Once the stored
+    vectors exceed `maxBytes`, the least recently used ones are evicted down
+    to 90% of the limit. Query embeddings are passed through.
+    """
+    def __init__(self,
+        embeddings:Embeddings,
+        path:str="reed.co.uk/embeddings.db",
+        model:Optional[str]=None,
+        maxBytes:int=2*1024*1024*1024):
+        self.embeddings=embeddings
+        self.model=model or modelName(embeddings)
+        self.maxBytes=maxBytes
+        self.hits=0
+        self.misses=0
+
+        # shared by the ingest pipeline threads, every access holds the lock
+        self._lock=threading.Lock()
+        self._conn=sqlite3.connect(path,check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                lastUsed REAL NOT NULL,
+                PRIMARY KEY (model,hash)
+            );
+            CREATE INDEX IF NOT EXISTS embeddingsLastUsed ON embeddings (lastUsed);
+        """)
+        self._conn.commit()
+        self._size=self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)),0) FROM embeddings").fetchone()[0]
+
+    def _lookup(self, hashes:list[str]) -> dict[str,list[float]]:
+        found={}
+        # stay below the sqlite host parameter limit
+        for start in range(0,len(hashes),500):
+            chunk=hashes[start:start+500]
+            rows=self._conn.execute(
+                f"SELECT hash, vector FROM embeddings WHERE model=? AND hash IN ({','.join('?'*len(chunk))})",
+                (self.model,*chunk)).fetchall()
+            for hash,vector in rows:
+                found[hash]=np.frombuffer(vector,dtype=np.float32).tolist()
+        if found:
+            self._conn.executemany(
+                "UPDATE embeddings SET lastUsed=? WHERE model=? AND hash=?",
+                [(time.time(),self.model,hash) for hash in found])
+        return found
+
+    def _store(self, rows:dict[str,list[float]]) -> None:
+        now=time.time()
+        blobs=[(self.model,hash,np.asarray(vector,dtype=np.float32).tobytes(),now) for hash,vector in rows.items()]
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (model,hash,vector,lastUsed) VALUES (?,?,?,?)",blobs)
+        self._size+=sum(len(blob[2]) for blob in blobs)
+        if self._size > self.maxBytes:
+            self._evict()
+
+    def _evict(self) -> None:
+        target=int(self.maxBytes*0.9)
+        count,total=self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)),0) FROM embeddings").fetchone()
+        if total > target and count:
+            excess=int((total-target)/(total/count))+1
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY lastUsed LIMIT ?)",
+                (excess,))
+        self._size=self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)),0) FROM embeddings").fetchone()[0]
+
+    def _split(self, texts:list[str]) -> tuple[list[str],dict,dict]:
+        """(hashes, cached vectors by hash, texts to embed by hash) of a batch"""
+        hashes=[textHash(text) for text in texts]
+        with self._lock:
+            cached=self._lookup(list(set(hashes)))
+            self._conn.commit()
+
+        missing={}
+        for hash,text in zip(hashes,texts):
+            if hash not in cached:
+                missing.setdefault(hash,text)
+        with self._lock:
+            self.hits+=len(texts)-sum(1 for hash in hashes if hash in missing)
+            self.misses+=len(missing)
+        return hashes,cached,missing
+
+    def _merge(self, hashes:list[str], cached:dict, missing:dict, vectors:list[list[float]]) -> list[list[float]]:
+        if missing:
+            computed=dict(zip(missing.keys(),vectors))
+            with self._lock:
+                self._store(computed)
+                self._conn.commit()
+            cached.update(computed)
+        return [list(cached[hash]) for hash in hashes]
+
+    def embed_documents(self, texts:list[str]) -> list[list[float]]:
+        hashes,cached,missing=self._split(texts)
+        vectors=self.embeddings.embed_documents(list(missing.values())) if missing else []
+        return self._merge(hashes,cached,missing,vectors)
+
+    def mapBatches(self, batches:Iterable[list[str]]) -> Iterator[list[list[float]]]:
+        """
+        Embed a stream of batches in order. The cache misses of each batch are
+        one embed request, with a ConcurrentEmbeddings inside several of them
+        are in flight at once.
+        """
+        if not hasattr(self.embeddings,'mapBatches'):
+            for texts in batches:
+                yield self.embed_documents(texts)
+            return
+
+        pending=deque()
+        def misses() -> Iterator[list[str]]:
+            for texts in batches:
+                split=self._split(texts)
+                pending.append(split)
+                # a fully cached batch is still passed on (empty) to keep the results aligned
+                yield list(split[2].values())
+        for vectors in self.embeddings.mapBatches(misses()):
+            yield self._merge(*pending.popleft(),vectors)
+
+    def embed_query(self, text:str) -> list[float]:
+        return self.embeddings.embed_query(text)
+
+    def sample(self, size:int) -> np.ndarray:
+        """Up to `size` random cached document vectors of the model, e.g. to fit a projection"""
+        with self._lock:
+            rows=self._conn.execute(
+                "SELECT vector FROM embeddings WHERE model=? ORDER BY RANDOM() LIMIT ?",(self.model,size)).fetchall()
+        return np.array([np.frombuffer(vector,dtype=np.float32) for vector, in rows],dtype=np.float32)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+class QueryCachedEmbeddings(Embeddings):
+    """
+    Bounded LRU cache of query embeddings in front of any langchain Embeddings.
+
+    Queries are keyed by (model name, normalized query text), entries older
+    than `ttl` seconds are embedded again (None keeps them until evicted),
+    at most `maxsize` queries are kept. Document embeddings are passed
+    through, wrap a CachedEmbeddings to cache those on disk as well.
+    """
+    def __init__(self, embeddings:Embeddings, maxsize:int=1024, ttl:Optional[float]=3600, model:Optional[str]=None):
+        self.embeddings=embeddings
+        self.model=model or modelName(embeddings)
+        self.maxsize=maxsize
+        self.ttl=ttl
+        self.hits=0
+        self.misses=0
+        self._cache=OrderedDict()
+        # shared by FastAPI handlers and the embeddings loop thread
+        self._lock=threading.Lock()
+
+    @property
+    def hitRate(self) -> float:
+        return self.hits/max(self.hits+self.misses,1)
+
+    def _get(self, key:tuple) -> Optional[list[float]]:
+        with self._lock:
+            entry=self._cache.get(key)
+            if entry is not None and (self.ttl is None or time.monotonic()-entry[0] < self.ttl):
+                self._cache.move_to_end(key)
+                self.hits+=1
+                return entry[1]
+            self.misses+=1
+            return None
+
+    def _put(self, key:tuple, vector:list[float]) -> None:
+        with self._lock:
+            self._cache[key]=(time.monotonic(),vector)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def embed_query(self, text:str) -> list[float]:
+        key=(self.model,normalizeQuery(text))
+        vector=self._get(key)
+        if vector is None:
+            vector=self.embeddings.embed_query(text)
+            self._put(key,vector)
+        return list(vector)
+
+    async def aembed_query(self, text:str) -> list[float]:
+        key=(self.model,normalizeQuery(text))
+        vector=self._get(key)
+        if vector is None:
+            vector=await self.embeddings.aembed_query(text)
+            self._put(key,vector)
+        return list(vector)
+
+    def embed_documents(self, texts:list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts:list[str]) -> list[list[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def mapBatches(self, batches:Iterable[list[str]]) -> Iterator[list[list[float]]]:
+        if hasattr(self.embeddings,'mapBatches'):
+            yield from self.embeddings.mapBatches(batches)
+        else:
+            for texts in batches:
+                yield self.embeddings.embed_documents(texts)
+
+    def stats(self) -> dict:
+        return {'hits':self.hits,'misses':self.misses,'hitRate':self.hitRate,'size':len(self._cache)}
+
+class ConcurrentEmbeddings(Embeddings):
+    """
+    Keeps up to `maxInFlight` embedding requests of `batchSize` texts in flight.
+
+    Requests go through the async api of the wrapped Embeddings on an event
+    loop owned by this object, running in a background thread, so the same
+    instance serves the sync ingest scripts and async FastAPI handlers.
+    Results always come back in input order. mapBatches only pulls the next
+    batch from its producer once a request slot is free, which throttles the
+    producer to the speed of the model server. For ollama, set
+    OLLAMA_NUM_PARALLEL on the server to at least `maxInFlight`.
+    """
+    def __init__(self, embeddings:Embeddings, maxInFlight:int=4, batchSize:int=8):
+        self.embeddings=embeddings
+        self.model=modelName(embeddings)
+        self.maxInFlight=maxInFlight
+        self.batchSize=batchSize
+        self._loop=asyncio.new_event_loop()
+        self._thread=threading.Thread(target=self._loop.run_forever,name="embeddings-loop",daemon=True)
+        self._thread.start()
+        self._semaphore=asyncio.Semaphore(maxInFlight)
+
+    def _batches(self, texts:list[str]) -> Iterator[list[str]]:
+        texts=iter(texts)
+        while batch := list(islice(texts,self.batchSize)):
+            yield batch
+
+    async def _embedBatch(self, texts:list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        async with self._semaphore:
+            return await self.embeddings.aembed_documents(texts)
+
+    def _submit(self, coro) -> Future:
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("ConcurrentEmbeddings cannot be called from its own event loop")
+        return asyncio.run_coroutine_threadsafe(coro,self._loop)
+
+    def mapBatches(self, batches:Iterable[list[str]]) -> Iterator[list[list[float]]]:
+        """Embed a stream of batches, yielding the vectors of each batch in order"""
+        pending=deque()
+        for batch in batches:
+            pending.append(self._submit(self._embedBatch(batch)))
+            if len(pending) >= self.maxInFlight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def embed_documents(self, texts:list[str]) -> list[list[float]]:
+        return [vector for vectors in self.mapBatches(self._batches(texts)) for vector in vectors]
+
+    async def aembed_documents(self, texts:list[str]) -> list[list[float]]:
+        results=await asyncio.gather(*(
+            asyncio.wrap_future(self._submit(self._embedBatch(batch))) for batch in self._batches(texts)
+        ))
+        return [vector for vectors in results for vector in vectors]
+
+    def embed_query(self, text:str) -> list[float]:
+        return self._submit(self.embeddings.aembed_query(text)).result()
+
+    async def aembed_query(self, text:str) -> list[float]:
+        return await asyncio.wrap_future(self._submit(self.embeddings.aembed_query(text)))
+
+    def close(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
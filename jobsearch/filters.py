@@ -0,0 +1,166 @@
+import datetime, json, os
+from typing import Any, Optional
+import numpy as np
+
+# exact match fields, values are compared case-insensitively
+TAG_FIELDS=('locationName','employerId','contractType','fullTime','partTime')
+# numeric fields queried by (low, high) ranges, dates are stored as days since 1970-01-01
+RANGE_FIELDS=('minimumSalary','maximumSalary','datePosted','expirationDate')
+DATE_FIELDS=('datePosted','expirationDate')
+
+EPOCH=datetime.date(1970,1,1)
+
+def parseDate(value:Any) -> Optional[float]:
+    """Days since 1970-01-01 of a date, a reed dd/mm/yyyy string or an iso yyyy-mm-dd string"""
+    if value is None:
+        return None
+    if isinstance(value,datetime.datetime):
+        value=value.date()
+    if isinstance(value,str):
+        value=value.strip()
+        for format in ("%d/%m/%Y","%Y-%m-%d"):
+            try:
+                value=datetime.datetime.strptime(value,format).date()
+                break
+            except ValueError:
+                pass
+        else:
+            return None
+    return float((value-EPOCH).days)
+
+def _tagValue(value:Any) -> str:
+    return str(value).strip().lower()
+
+class MetadataIndex:
+    """
+    Columnar index over the job metadata of the rows of a MatrixVectorStore.
+
+    Tag fields are dictionary encoded into an int32 column (-1 = missing),
+    range fields are float64 columns (NaN = missing). A filter is evaluated
+    as vectorized comparisons into a boolean row mask (a bitmap), so the
+    store only scores the rows passing it. Filters are dicts:
+
+        {'locationName':'London', 'fullTime':True,
+         'salary':(45000,55000), 'datePosted':('01/03/2025',None)}
+
+    A tag value can be a list (any of them), a range is (low, high) with
+    None for an open end. 'salary' matches jobs whose min/max salary range
+    overlaps the given range.
+    """
+    def __init__(self):
+        self._size=0
+        self._capacity=0
+        self._codes={field:{} for field in TAG_FIELDS}
+        self._tags={field:np.empty(0,dtype=np.int32) for field in TAG_FIELDS}
+        self._ranges={field:np.empty(0,dtype=np.float64) for field in RANGE_FIELDS}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, rows:int) -> None:
+        if self._size+rows <= self._capacity:
+            return
+        self._capacity=max(2*self._capacity,self._size+rows,1024)
+        for columns,fill in ((self._tags,-1),(self._ranges,np.nan)):
+            for field,column in columns.items():
+                grown=np.full(self._capacity,fill,dtype=column.dtype)
+                grown[:self._size]=column[:self._size]
+                columns[field]=grown
+
+    def _encode(self, field:str, value:Any) -> int:
+        if value is None:
+            return -1
+        return self._codes[field].setdefault(_tagValue(value),len(self._codes[field]))
+
+    def _number(self, field:str, value:Any) -> float:
+        if value is None:
+            return np.nan
+        if field in DATE_FIELDS:
+            days=parseDate(value)
+            return np.nan if days is None else days
+        try:
+            return float(value)
+        except (TypeError,ValueError):
+            return np.nan
+
+    def set(self, row:int, metadata:dict) -> None:
+        for field in TAG_FIELDS:
+            self._tags[field][row]=self._encode(field,metadata.get(field))
+        for field in RANGE_FIELDS:
+            self._ranges[field][row]=self._number(field,metadata.get(field))
+
+    def append(self, metadatas:list[dict]) -> None:
+        self._reserve(len(metadatas))
+        for metadata in metadatas:
+            self.set(self._size,metadata)
+            self._size+=1
+
+    def move(self, src:int, dst:int) -> None:
+        for columns in (self._tags,self._ranges):
+            for column in columns.values():
+                column[dst]=column[src]
+
+    def truncate(self, size:int) -> None:
+        self._size=size
+
+    def _range(self, field:str, bounds:tuple) -> np.ndarray:
+        column=self._ranges[field][:self._size]
+        low,high=bounds
+        mask=~np.isnan(column)
+        if low is not None:
+            mask&=column >= self._number(field,low)
+        if high is not None:
+            mask&=column <= self._number(field,high)
+        return mask
+
+    def mask(self, filter:dict) -> np.ndarray:
+        """Boolean mask of the rows matching every condition of `filter`"""
+        mask=np.ones(self._size,dtype=bool)
+        for field,condition in filter.items():
+            if field == 'salary':
+                # salary ranges overlapping the wanted range, a job without a maximum only needs its minimum
+                low,high=condition
+                minimum=self._ranges['minimumSalary'][:self._size]
+                maximum=self._ranges['maximumSalary'][:self._size]
+                if high is not None:
+                    mask&=minimum <= high
+                if low is not None:
+                    mask&=np.where(np.isnan(maximum),minimum >= low,maximum >= low)
+            elif field in self._ranges:
+                mask&=self._range(field,condition)
+            elif field in self._tags:
+                values=condition if isinstance(condition,(list,set,frozenset)) else [condition]
+                codes=[self._codes[field].get(_tagValue(value),-2) for value in values]
+                mask&=np.isin(self._tags[field][:self._size],codes)
+            else:
+                raise ValueError(f"{field} is not an indexed metadata field, expected one of "
+                    f"{', '.join(TAG_FIELDS+RANGE_FIELDS+('salary',))}")
+        return mask
+
+    def save(self, path:str) -> None:
+        os.makedirs(path,exist_ok=True)
+        columns={f"tag-{field}":column[:self._size] for field,column in self._tags.items()}
+        columns.update({f"range-{field}":column[:self._size] for field,column in self._ranges.items()})
+        # temp files first, a crash never leaves a half written file
+        tmp=os.path.join(path,"metadata-index.npz.tmp")
+        with open(tmp,"wb") as file:
+            np.savez(file,**columns)
+        os.replace(tmp,os.path.join(path,"metadata-index.npz"))
+        tmp=os.path.join(path,"metadata-index.json.tmp")
+        with open(tmp,"w") as file:
+            json.dump({'count':self._size,'codes':self._codes},file)
+        os.replace(tmp,os.path.join(path,"metadata-index.json"))
+
+    @classmethod
+    def load(cls, path:str) -> "MetadataIndex":
+        with open(os.path.join(path,"metadata-index.json"),"r") as file:
+            info=json.load(file)
+        index=cls()
+        index._size=index._capacity=info['count']
+        index._codes={field:info['codes'].get(field,{}) for field in TAG_FIELDS}
+        with np.load(os.path.join(path,"metadata-index.npz")) as columns:
+            for field in TAG_FIELDS:
+                index._tags[field]=columns[f"tag-{field}"].copy()
+            for field in RANGE_FIELDS:
+                index._ranges[field]=columns[f"range-{field}"].copy()
+        return index
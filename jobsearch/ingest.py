@@ -0,0 +1,271 @@
+import random, threading, time
+from collections import deque
+from itertools import islice
+from queue import Queue
+from typing import Callable, Iterable, Iterator, Optional
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from jobsearch.corpus import JobCorpus
+from jobsearch.documents import JobDocumentBuilder
+from jobsearch.normalize import NormalizedCache, normalizeCorpus
+from jobsearch.ingeststate import IngestState, chunkIds, documentHash, expiresAt
+from jobsearch.redisindex import derivedFields, missingFields
+
+# a stage takes the iterator of the previous stage and yields its own output
+Stage=Callable[[Iterator],Iterator]
+
+_DONE=object()
+
+class _StageError:
+    def __init__(self, error:BaseException):
+        self.error=error
+
+def _runStage(stage:Stage, source:Iterator, output:Queue) -> None:
+    try:
+        for item in stage(source):
+            output.put(item)
+    except BaseException as e:
+        output.put(_StageError(e))
+    else:
+        output.put(_DONE)
+
+def _drain(queue:Queue) -> Iterator:
+    while True:
+        item=queue.get()
+        if item is _DONE:
+            return
+        if isinstance(item,_StageError):
+            raise item.error
+        yield item
+
+def pipeline(source:Iterable, *stages:Stage, queueSize:int=2) -> Iterator:
+    """
+    Chain generator stages, each running in its own thread.
+
+    Stages are connected by queues holding at most `queueSize` items, so a
+    slow stage blocks the ones before it instead of letting them read ahead.
+    Together with batching in the stages, the number of items alive at any
+    time is bounded by the batch size, not by the size of the source. An
+    exception in any stage is raised from the returned iterator.
+    """
+    iterator=iter(source)
+    for stage in stages:
+        queue=Queue(maxsize=queueSize)
+        threading.Thread(target=_runStage,args=(stage,iterator,queue),daemon=True).start()
+        iterator=_drain(queue)
+    return iterator
+
+def batched(items:Iterable, size:int) -> Iterator[list]:
+    items=iter(items)
+    while batch := list(islice(items,size)):
+        yield batch
+
+def loadCorpus(corpus:JobCorpus, sampleSize:Optional[int]=None) -> Iterator[dict]:
+    """Stream the jobs of a corpus, or a random sample of `sampleSize` jobs"""
+    if sampleSize is None:
+        for _,job in corpus.scan():
+            yield job
+    else:
+        for jobId in random.sample(corpus.keys(),min(sampleSize,len(corpus))):
+            yield corpus.get(jobId)
+
+def buildDocuments(
+    builder:Optional[JobDocumentBuilder]=None,
+    cache:Optional[NormalizedCache]=None,
+    processes:Optional[int]=None) -> Stage:
+    """
+    Build the Document of every job. With a NormalizedCache the html is
+    converted by normalizeCorpus, read from the cache (filled by
+    22-reed.co.uk-normalize.py) or parsed on a process pool, instead of
+    in this stage's thread. The default builder keeps no documents, one
+    pass over the corpus never builds the same job twice.
+    """
+    builder=builder or JobDocumentBuilder(maxsize=0)
+    def stage(jobs:Iterator[dict]) -> Iterator[Document]:
+        if cache is None:
+            yield from builder.iterDocuments(jobs)
+        else:
+            yield from builder.iterDocuments(normalizeCorpus(jobs,cache=cache,processes=processes),normalized=True)
+    return stage
+
+def skipUnchanged(state:IngestState, onSkip:Optional[Callable[[Document,str],None]]=None) -> Stage:
+    """
+    Drop jobs already written with the same content, and jobs already expired.
+
+    The hash of every passing job is kept by state.expect(), trackedWriter
+    takes it from there to record the job once it is written.
+    """
+    def stage(docs:Iterator[Document]) -> Iterator[Document]:
+        now=time.time()
+        for doc in docs:
+            jobId=doc.metadata.get('jobId',doc.id)
+            expires=expiresAt(doc.metadata)
+            hash=documentHash(doc)
+            if expires is not None and expires < now:
+                reason="expired"
+            elif state.isCurrent(jobId,hash):
+                reason="unchanged"
+            else:
+                state.expect(jobId,hash)
+                yield doc
+                continue
+            if onSkip is not None:
+                onSkip(doc,reason)
+    return stage
+
+def chunkDocuments(splitter:Optional[Callable[[Document],list[Document]]]=None) -> Stage:
+    """Split each document with `splitter`, documents pass through unchanged without one"""
+    def stage(docs:Iterator[Document]) -> Iterator[Document]:
+        for doc in docs:
+            if splitter is None:
+                yield doc
+            else:
+                yield from splitter(doc)
+    return stage
+
+def embedBatches(embeddings:Embeddings, batchSize:int=32) -> Stage:
+    """
+    Group documents into batches and embed each batch with one embed_documents call.
+
+    With an embeddings offering mapBatches (ConcurrentEmbeddings) several
+    batches are embedded concurrently, still yielded in input order.
+    """
+    def stage(docs:Iterator[Document]) -> Iterator[tuple[list[Document],list[list[float]]]]:
+        batches=batched(docs,batchSize)
+        if not hasattr(embeddings,'mapBatches'):
+            for batch in batches:
+                yield batch,embeddings.embed_documents([doc.page_content for doc in batch])
+            return
+
+        inFlight=deque()
+        def texts() -> Iterator[list[str]]:
+            for batch in batches:
+                inFlight.append(batch)
+                yield [doc.page_content for doc in batch]
+        for vectors in embeddings.mapBatches(texts()):
+            yield inFlight.popleft(),vectors
+    return stage
+
+def writeBatches(writer:Callable[[list[Document],list[list[float]]],list[str]]) -> Stage:
+    """Write embedded batches with `writer`, yields the ids written per batch"""
+    def stage(batches:Iterator[tuple[list[Document],list[list[float]]]]) -> Iterator[list[str]]:
+        for docs,vectors in batches:
+            yield writer(docs,vectors)
+    return stage
+
+def trackedWriter(
+    writer:Callable[[list[Document],list[list[float]]],list[str]],
+    vectorStore,
+    state:IngestState) -> Callable[[list[Document],list[list[float]]],list[str]]:
+    """
+    Wrap a writer to keep the IngestState of the index up to date.
+
+    A job is recorded once its last chunk is written. When a changed job has
+    fewer chunks than before, the chunks left over are deleted from the store.
+    """
+    def write(docs:list[Document], vectors:list[list[float]]) -> list[str]:
+        stale=[]
+        jobs=[]
+        for doc in docs:
+            jobId=doc.metadata.get('jobId',doc.id)
+            chunkIndex=doc.metadata.get('chunkIndex',0)
+            chunkCount=doc.metadata.get('chunkCount',1)
+            if 'chunkIndex' in doc.metadata and chunkIndex == 0:
+                stale.extend(chunkIds(jobId,state.chunkCount(jobId))[chunkCount:])
+            if chunkIndex == chunkCount-1:
+                jobs.append((jobId,state.takeExpected(jobId) or documentHash(doc),chunkCount,expiresAt(doc.metadata)))
+        ids=writer(docs,vectors)
+        if stale:
+            vectorStore.delete(stale)
+        state.record(jobs)
+        return ids
+    return write
+
+def evictExpired(state:IngestState, vectorStore, keywordIndex=None, now:Optional[float]=None) -> int:
+    """Delete the chunks of every expired job from the store (and keyword index), returns the number of jobs evicted"""
+    expired=state.expired(now)
+    if not expired:
+        return 0
+    ids=[chunkId for jobId,chunkCount in expired for chunkId in chunkIds(jobId,chunkCount)]
+    for start in range(0,len(ids),1000):
+        vectorStore.delete(ids[start:start+1000])
+    if keywordIndex is not None:
+        keywordIndex.remove([jobId for jobId,_ in expired])
+    state.remove([jobId for jobId,_ in expired])
+    return len(expired)
+
+def redisWriter(vectorStore, batchSize:Optional[int]=None) -> Callable[[list[Document],list[list[float]]],list[str]]:
+    """
+    Writer storing pre-computed embeddings into a langchain_redis RedisVectorStore.
+
+    Records are written with the redisvl index's load(), which validates
+    them and sends `batchSize` records per pipeline round trip (redisvl's
+    default if None). Documents are keyed by their id, so writing a chunk
+    again replaces it. Without a store-wide ttl a key expires at the end
+    of its job's expirationDate.
+    """
+    from redisvl.redis.utils import array_to_buffer
+    from redisvl.utils.utils import create_ulid
+
+    config=vectorStore.config
+    index=vectorStore.index
+    client=config.redis()
+    isJson=config.storage_type == "json"
+
+    def toRecord(doc:Document, vector:list[float]) -> dict:
+        record={
+            config.content_field:doc.page_content,
+            config.embedding_field:vector if isJson else array_to_buffer(vector,dtype=config.vector_datatype),
+        }
+        for field,value in doc.metadata.items():
+            if isinstance(value,list):
+                value=config.default_tag_separator.join(value)
+            elif isinstance(value,bool):
+                # redis hashes only take str, bytes and numbers, and the job index has them as NUMERIC
+                value=int(value)
+            record[field]=value
+        # numeric copies of the dates and the salary ceiling for range filters
+        record.update(derivedFields(doc.metadata))
+        record.update(missingFields(record))
+        return record
+
+    def write(docs:list[Document], vectors:list[list[float]]) -> list[str]:
+        keys=[index.key(doc.id or create_ulid()) for doc in docs]
+        if not isJson:
+            # hset only overwrites the given fields, drop the fields of the previous version
+            client.delete(*keys)
+        index.load(
+            [toRecord(doc,vector) for doc,vector in zip(docs,vectors)],
+            keys=keys,ttl=vectorStore.ttl,batch_size=batchSize)
+        if not vectorStore.ttl:
+            pipe=client.pipeline(transaction=False)
+            for key,doc in zip(keys,docs):
+                if (expires := expiresAt(doc.metadata)) is not None:
+                    pipe.expireat(key,int(expires))
+            pipe.execute()
+        return keys
+    return write
+
+class ThroughputMeter:
+    """Counts processed items and prints the items/sec every `interval` seconds"""
+    def __init__(self, label:str="docs", interval:float=5.0):
+        self.label=label
+        self.interval=interval
+        self.count=0
+        self._start=time.monotonic()
+        self._lastReport=self._start
+
+    @property
+    def rate(self) -> float:
+        return self.count/max(time.monotonic()-self._start,1e-9)
+
+    def update(self, count:int) -> None:
+        self.count+=count
+        now=time.monotonic()
+        if now-self._lastReport >= self.interval:
+            self._lastReport=now
+            self.report()
+
+    def report(self) -> None:
+        elapsed=time.monotonic()-self._start
+        print(f"{self.count} {self.label} in {elapsed:.1f}s, {self.rate:.1f} {self.label}/sec")
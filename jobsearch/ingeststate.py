@@ -0,0 +1,113 @@
+import sqlite3, threading, time
+from typing import Optional
+from langchain_core.documents import Document
+from jobsearch.filters import parseDate
+from jobsearch.manifest import contentHash
+
+def documentHash(doc:Document) -> str:
+    return contentHash({'text':doc.page_content,'metadata':doc.metadata})
+
+def expiresAt(metadata:dict) -> Optional[float]:
+    """Unix time at the end of the expirationDate of a job, None if it has none"""
+    days=parseDate(metadata.get('expirationDate'))
+    return None if days is None else (days+1)*86400
+
+def chunkIds(jobId:str, chunkCount:int) -> list[str]:
+    """Ids of the chunks of a job, as given by JobChunker"""
+    return [f"{jobId}-{i}" for i in range(chunkCount)]
+
+class IngestState:
+    """
+    Persistent record of the jobs written into one vector index, kept in sqlite.
+
+    Every job has the hash of its document, the number of chunks written and
+    when it expires. The ingest skips jobs whose hash did not change, deletes
+    the chunks left over when a job shrinks, and evictExpired() removes the
+    jobs past their expirationDate from the index. Several indexes (redis
+    jobs, jobs-pca256, the local store) share one database by `indexName`.
+    """
+    def __init__(self, path:str="reed.co.uk/ingest-state.db", indexName:str="jobs"):
+        self.indexName=indexName
+        # used by the skip and the write stages of the ingest pipeline
+        self._lock=threading.Lock()
+        self._conn=sqlite3.connect(path,check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                indexName TEXT NOT NULL,
+                jobId TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                chunkCount INTEGER NOT NULL,
+                expiresAt REAL,
+                PRIMARY KEY (indexName,jobId)
+            );
+            CREATE INDEX IF NOT EXISTS jobsExpiresAt ON jobs (indexName,expiresAt);
+        """)
+        self._conn.commit()
+        # hashes of the jobs between the skip and the write stage, by jobId
+        self._inFlight={}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE indexName=?",(self.indexName,)).fetchone()[0]
+
+    def isCurrent(self, jobId:str, hash:str) -> bool:
+        """True if the job was written with this hash"""
+        with self._lock:
+            row=self._conn.execute(
+                "SELECT hash FROM jobs WHERE indexName=? AND jobId=?",(self.indexName,str(jobId))).fetchone()
+        return row is not None and row[0] == hash
+
+    def chunkCount(self, jobId:str) -> int:
+        with self._lock:
+            row=self._conn.execute(
+                "SELECT chunkCount FROM jobs WHERE indexName=? AND jobId=?",(self.indexName,str(jobId))).fetchone()
+        return row[0] if row else 0
+
+    def expect(self, jobId:str, hash:str) -> None:
+        """Remember the hash of a job passed on to be written, until takeExpected() is called for it"""
+        with self._lock:
+            self._inFlight[str(jobId)]=hash
+
+    def takeExpected(self, jobId:str) -> Optional[str]:
+        with self._lock:
+            return self._inFlight.pop(str(jobId),None)
+
+    def record(self, jobs:list[tuple[str,str,int,Optional[float]]]) -> None:
+        """Record written jobs as (jobId, hash, chunkCount, expiresAt)"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO jobs (indexName,jobId,hash,chunkCount,expiresAt) VALUES (?,?,?,?,?)",
+                [(self.indexName,str(jobId),hash,chunkCount,expires) for jobId,hash,chunkCount,expires in jobs])
+            self._conn.commit()
+
+    def expired(self, now:Optional[float]=None) -> list[tuple[str,int]]:
+        """(jobId, chunkCount) of the jobs expired at `now`"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT jobId, chunkCount FROM jobs WHERE indexName=? AND expiresAt < ?",
+                (self.indexName,time.time() if now is None else now)).fetchall()
+
+    def remove(self, jobIds:list[str]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM jobs WHERE indexName=? AND jobId=?",[(self.indexName,str(jobId)) for jobId in jobIds])
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Forget every job of the index, e.g. when the index is rebuilt from scratch"""
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE indexName=?",(self.indexName,))
+            self._conn.commit()
@@ -0,0 +1,193 @@
+import json, math, os, re
+from array import array
+from collections import Counter
+from typing import Callable, Iterator, Optional
+import numpy as np
+from langchain_core.documents import Document
+from jobsearch.vectorstore import topK
+
+TOKEN=re.compile(r"\w+")
+
+def tokenize(text:str) -> list[str]:
+    return TOKEN.findall(text.lower())
+
+def jobKey(doc:Document) -> str:
+    return str(doc.metadata.get('jobId',doc.id))
+
+class KeywordIndex:
+    """
+    In-process BM25 index over job documents.
+
+    Postings are append-only arrays of (row, term frequency) per term, so
+    adding a document only touches the postings of its own terms. Removing
+    or replacing a document marks its row dead, dead rows are skipped when
+    scoring. A query is scored with numpy over the postings of its terms,
+    without calling the embedding model.
+    """
+    def __init__(self, k1:float=1.5, b:float=0.75):
+        self.k1=k1
+        self.b=b
+        self._postings={}
+        self._df=Counter()
+        self._docs=[]
+        self._rows={}
+        self._lengths=array('f')
+        self._live=bytearray()
+        self._totalLength=0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, docId:str) -> bool:
+        return docId in self._rows
+
+    def add(self, doc:Document) -> None:
+        """Index a document by its id, an existing document with that id is replaced"""
+        docId=doc.id or jobKey(doc)
+        self.remove([docId])
+        terms=Counter(tokenize(doc.page_content))
+        row=len(self._docs)
+        self._docs.append(doc)
+        self._rows[docId]=row
+        self._lengths.append(sum(terms.values()))
+        self._live.append(1)
+        self._totalLength+=sum(terms.values())
+        for term,count in terms.items():
+            rows,counts=self._postings.setdefault(term,(array('i'),array('f')))
+            rows.append(row)
+            counts.append(count)
+            self._df[term]+=1
+
+    def remove(self, ids:list[str]) -> None:
+        for docId in ids:
+            row=self._rows.pop(docId,None)
+            if row is None:
+                continue
+            self._live[row]=0
+            self._totalLength-=int(self._lengths[row])
+            for term in set(tokenize(self._docs[row].page_content)):
+                self._df[term]-=1
+            self._docs[row]=None
+
+    def search(self, query:str, k:int=4) -> list[tuple[Document,float]]:
+        """The k best (Document, BM25 score) of a keyword query, best first"""
+        if not self._rows:
+            return []
+        count=len(self._rows)
+        lengths=np.frombuffer(self._lengths,dtype=np.float32)
+        norm=self.k1*(1-self.b+self.b*lengths/(self._totalLength/count or 1.0))
+        scores=np.zeros(len(self._docs),dtype=np.float32)
+        for term in set(tokenize(query)):
+            if not self._df.get(term):
+                continue
+            rows,counts=self._postings[term]
+            rows=np.frombuffer(rows,dtype=np.int32)
+            counts=np.frombuffer(counts,dtype=np.float32)
+            idf=math.log(1+(count-self._df[term]+0.5)/(self._df[term]+0.5))
+            # a row appears at most once per term, plain fancy index assignment is enough
+            scores[rows]+=idf*counts*(self.k1+1)/(counts+norm[rows])
+        scores[np.frombuffer(self._live,dtype=np.uint8) == 0]=0
+        top=topK(scores,k)
+        return [(self._docs[row],float(scores[row])) for row in top if scores[row] > 0]
+
+    def save(self, path:str) -> None:
+        """Write the live documents and their postings into directory `path`, dead rows are dropped"""
+        os.makedirs(path,exist_ok=True)
+        live=np.frombuffer(self._live,dtype=np.uint8).astype(bool)
+        # new row numbers of the live rows
+        renumber=np.cumsum(live)-1
+        terms,offsets,rows,counts=[],[0],[],[]
+        for term,(termRows,termCounts) in self._postings.items():
+            termRows=np.frombuffer(termRows,dtype=np.int32)
+            keep=live[termRows]
+            if not keep.any():
+                continue
+            terms.append(term)
+            rows.append(renumber[termRows[keep]].astype(np.int32))
+            counts.append(np.frombuffer(termCounts,dtype=np.float32)[keep])
+            offsets.append(offsets[-1]+int(keep.sum()))
+        with open(os.path.join(path,"docs.jsonl"),"w",encoding="utf-8") as file:
+            for doc in self._docs:
+                if doc is not None:
+                    file.write(json.dumps({'id':doc.id,'text':doc.page_content,'metadata':doc.metadata},ensure_ascii=False)+"\n")
+        np.savez(os.path.join(path,"postings.npz"),
+            terms=np.array(terms,dtype=str),
+            offsets=np.array(offsets,dtype=np.int64),
+            rows=np.concatenate(rows) if rows else np.empty(0,dtype=np.int32),
+            counts=np.concatenate(counts) if counts else np.empty(0,dtype=np.float32),
+            lengths=np.frombuffer(self._lengths,dtype=np.float32)[live])
+
+    @classmethod
+    def load(cls, path:str, **kwargs) -> "KeywordIndex":
+        index=cls(**kwargs)
+        with open(os.path.join(path,"docs.jsonl"),"r",encoding="utf-8") as file:
+            for line in file:
+                data=json.loads(line)
+                index._rows[data['id']]=len(index._docs)
+                index._docs.append(Document(id=data['id'],page_content=data['text'],metadata=data['metadata']))
+        with np.load(os.path.join(path,"postings.npz")) as postings:
+            offsets,rows,counts=postings['offsets'],postings['rows'],postings['counts']
+            for i,term in enumerate(postings['terms'].tolist()):
+                termRows=array('i',rows[offsets[i]:offsets[i+1]].tobytes())
+                index._postings[term]=(termRows,array('f',counts[offsets[i]:offsets[i+1]].tobytes()))
+                index._df[term]=len(termRows)
+            index._lengths=array('f',postings['lengths'].tobytes())
+        index._live=bytearray(b"\x01"*len(index._docs))
+        index._totalLength=int(sum(index._lengths))
+        return index
+
+def indexKeywords(index:KeywordIndex) -> Callable[[Iterator[Document]],Iterator[Document]]:
+    """Ingest stage adding every job document to a KeywordIndex, documents pass through unchanged"""
+    def stage(docs:Iterator[Document]) -> Iterator[Document]:
+        for doc in docs:
+            index.add(doc)
+            yield doc
+    return stage
+
+def fuseResults(
+    rankings:list[list],
+    k:int=4,
+    method:str="rrf",
+    weights:Optional[list[float]]=None,
+    rrfK:int=60,
+    key:Callable[[Document],str]=jobKey,
+    higherIsBetter:Optional[list[bool]]=None) -> list[tuple[Document,float]]:
+    """
+    Fuse ranked result lists, e.g. dense and BM25 hits, into one list of (Document, score).
+
+    Results are Documents or (Document, score) tuples, best first, matched
+    across lists by `key` (the jobId). "rrf" is reciprocal rank fusion, sum
+    of weight/(rrfK+rank). "weighted" min-max normalizes the scores of each
+    list and sums them with `weights`. higherIsBetter gives the direction of
+    the scores of each list (default True), False for distances such as
+    the cosine distance of RedisVectorStore.
+    """
+    if method not in ("rrf","weighted"):
+        raise ValueError(f"unknown fusion method {method}, expected rrf or weighted")
+    weights=weights or [1.0]*len(rankings)
+    higherIsBetter=higherIsBetter or [True]*len(rankings)
+    fused={}
+    docs={}
+    for ranking,weight,higher in zip(rankings,weights,higherIsBetter):
+        scores=[result[1] if isinstance(result,tuple) else 0.0 for result in ranking]
+        low,high=(min(scores),max(scores)) if scores else (0.0,0.0)
+        seen=set()
+        for rank,result in enumerate(ranking):
+            doc=result[0] if isinstance(result,tuple) else result
+            docKey=key(doc)
+            # several chunks of a job in one list only count with the best one
+            if docKey in seen:
+                continue
+            seen.add(docKey)
+            docs.setdefault(docKey,doc)
+            if method == "rrf":
+                score=weight/(rrfK+rank+1)
+            elif high > low:
+                # 1 for the best score of the list, 0 for the worst
+                normalized=(scores[rank]-low)/(high-low)
+                score=weight*(normalized if higher else 1.0-normalized)
+            else:
+                score=weight
+            fused[docKey]=fused.get(docKey,0.0)+score
+    ranked=sorted(fused.items(),key=lambda item: item[1],reverse=True)[:k]
+    return [(docs[docKey],score) for docKey,score in ranked]
@@ -0,0 +1,128 @@
+import datetime, hashlib, json, sqlite3
+from typing import Optional
+
+def contentHash(data:dict) -> str:
+    """Stable hash of a json document, independent of key order"""
+    raw=json.dumps(data,sort_keys=True,separators=(",",":"),ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class CrawlManifest:
+    """
+    Persistent record of what the crawler already fetched, kept in sqlite.
+
+    jobs   - one row per jobId with the hash of its search result, the hash
+             of the fetched job detail and when it was fetched. A job whose
+             search result has been seen but whose detail is not fetched yet
+             is pending, pending jobs are picked up again by the next run.
+    cursor - the paging position (resultsToSkip) per keywords/location, saved
+             after every search page and cleared once the crawl completes.
+    """
+    def __init__(self, path:str="reed.co.uk/manifest.db"):
+        self.path=path
+        self._conn=sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                jobId TEXT PRIMARY KEY,
+                searchHash TEXT,
+                detailHash TEXT,
+                fetchedAt TEXT,
+                pending INTEGER NOT NULL DEFAULT 1
+            );
+            CREATE TABLE IF NOT EXISTS cursor (
+                query TEXT PRIMARY KEY,
+                resultsToSkip INTEGER NOT NULL,
+                updatedAt TEXT NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def _queryKey(keywords:str, location:str) -> str:
+        return f"{keywords}|{location}"
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+    def close(self) -> None:
+        self._conn.commit()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def loadCursor(self, keywords:str, location:str) -> int:
+        row=self._conn.execute(
+            "SELECT resultsToSkip FROM cursor WHERE query=?",
+            (self._queryKey(keywords,location),)).fetchone()
+        return row[0] if row else 0
+
+    def saveCursor(self, keywords:str, location:str, resultsToSkip:int) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cursor (query,resultsToSkip,updatedAt) VALUES (?,?,?)",
+            (self._queryKey(keywords,location),resultsToSkip,self._now()))
+        self._conn.commit()
+
+    def clearCursor(self, keywords:str, location:str) -> None:
+        self._conn.execute("DELETE FROM cursor WHERE query=?",(self._queryKey(keywords,location),))
+        self._conn.commit()
+
+    def recordSearchResult(self, job:dict) -> bool:
+        """Record a search result, returns True if its job detail needs to be fetched"""
+        jobId=str(job['jobId'])
+        searchHash=contentHash(job)
+        row=self._conn.execute(
+            "SELECT searchHash, pending FROM jobs WHERE jobId=?",(jobId,)).fetchone()
+        if row is not None and row[0] == searchHash and not row[1]:
+            return False
+
+        self._conn.execute("""
+            INSERT INTO jobs (jobId,searchHash,pending) VALUES (?,?,1)
+            ON CONFLICT(jobId) DO UPDATE SET searchHash=excluded.searchHash, pending=1
+        """,(jobId,searchHash))
+        return True
+
+    def searchResultChanged(self, job:dict) -> bool:
+        """True if a search result is new or changed, without recording it"""
+        row=self._conn.execute("SELECT searchHash FROM jobs WHERE jobId=?",(str(job['jobId']),)).fetchone()
+        return row is None or row[0] != contentHash(job)
+
+    def detailChanged(self, jobId:str, detail:dict) -> bool:
+        """True if a fetched job detail is new or changed, without recording it"""
+        row=self._conn.execute("SELECT detailHash FROM jobs WHERE jobId=?",(str(jobId),)).fetchone()
+        return row is None or row[0] != contentHash(detail)
+
+    def recordJobDetail(self, jobId:str, detail:dict) -> bool:
+        """
+        Record a fetched job detail, returns True if its content is new or changed.
+        The job stops being pending, so only call it once the detail is saved.
+        """
+        jobId=str(jobId)
+        detailHash=contentHash(detail)
+        row=self._conn.execute("SELECT detailHash FROM jobs WHERE jobId=?",(jobId,)).fetchone()
+        self._conn.execute("""
+            INSERT INTO jobs (jobId,detailHash,fetchedAt,pending) VALUES (?,?,?,0)
+            ON CONFLICT(jobId) DO UPDATE SET
+                detailHash=excluded.detailHash, fetchedAt=excluded.fetchedAt, pending=0
+        """,(jobId,detailHash,self._now()))
+        self._conn.commit()
+        return row is None or row[0] != detailHash
+
+    def pendingJobIds(self) -> list[str]:
+        return [row[0] for row in self._conn.execute("SELECT jobId FROM jobs WHERE pending=1")]
+
+    def get(self, jobId:str) -> Optional[dict]:
+        row=self._conn.execute(
+            "SELECT jobId, searchHash, detailHash, fetchedAt, pending FROM jobs WHERE jobId=?",
+            (str(jobId),)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('jobId','searchHash','detailHash','fetchedAt','pending'),row))
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
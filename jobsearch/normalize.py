@@ -0,0 +1,159 @@
+import json, os, re, sqlite3, threading
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+from jobsearch.manifest import contentHash
+
+# reed returns these fields as html fragments
+HTML_FIELDS=('jobDescription','salary')
+
+# tags that end a line of text, everything else is inline
+BLOCK_TAGS={
+    'p','div','br','li','ul','ol','tr','table','section','article',
+    'h1','h2','h3','h4','h5','h6','blockquote','pre','hr',
+}
+SKIP_TAGS={'script','style'}
+
+WHITESPACE=re.compile(r"[ \t\r\f\v\xa0]+")
+BLANK_LINES=re.compile(r"\n\s*\n+")
+
+class _TextExtractor(HTMLParser):
+    """Collects the text nodes while parsing, no document tree is built"""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts=[]
+        self._skip=0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip+=1
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip=max(0,self._skip-1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+def htmlToText(html:Optional[str]) -> str:
+    """Strip an html fragment down to text, one line per block element"""
+    if not html:
+        return ""
+    if "<" not in html and "&" not in html:
+        return WHITESPACE.sub(" ",html).strip()
+
+    parser=_TextExtractor()
+    parser.feed(html)
+    parser.close()
+    text=WHITESPACE.sub(" ","".join(parser.parts))
+    text="\n".join(line.strip() for line in text.split("\n"))
+    return BLANK_LINES.sub("\n\n",text).strip()
+
+def normalizeJob(job:dict) -> dict:
+    """Copy of a reed job with the html fields converted to text"""
+    normalized=dict(job)
+    for field in HTML_FIELDS:
+        if isinstance(job.get(field),str):
+            normalized[field]=htmlToText(job[field])
+    return normalized
+
+def _normalizeFields(job:dict) -> dict:
+    return {field:htmlToText(job[field]) for field in HTML_FIELDS if isinstance(job.get(field),str)}
+
+class NormalizedCache:
+    """sqlite cache of the normalized html fields, keyed by jobId and the hash of the raw job"""
+    def __init__(self, path:str="reed.co.uk/normalized.db"):
+        # opened by the main thread of a script, used by an ingest pipeline stage or the tool threads
+        self._lock=threading.Lock()
+        self._conn=sqlite3.connect(path,check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS normalized (
+                jobId TEXT PRIMARY KEY,
+                contentHash TEXT NOT NULL,
+                fields TEXT NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, jobId:str, hash:str) -> Optional[dict]:
+        with self._lock:
+            row=self._conn.execute(
+                "SELECT fields FROM normalized WHERE jobId=? AND contentHash=?",(str(jobId),hash)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def putMany(self, rows:Iterable[tuple[str,str,dict]]) -> None:
+        rows=[(str(jobId),hash,json.dumps(fields,ensure_ascii=False)) for jobId,hash,fields in rows]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO normalized (jobId,contentHash,fields) VALUES (?,?,?)",rows)
+            self._conn.commit()
+
+    def normalize(self, job:dict) -> dict:
+        """normalizeJob() of a single job, through the cache"""
+        hash=contentHash(job)
+        fields=self.get(job['jobId'],hash)
+        if fields is None:
+            fields=_normalizeFields(job)
+            self.putMany([(job['jobId'],hash,fields)])
+        return {**job,**fields}
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def normalizeCorpus(
+    jobs:Iterable[dict],
+    cache:Optional[NormalizedCache]=None,
+    processes:Optional[int]=None,
+    batchSize:int=1024,
+    chunksize:int=32) -> Iterator[dict]:
+    """
+    Normalize a stream of reed jobs, yielding them in input order.
+
+    Jobs are taken `batchSize` at a time. Cached jobs whose raw content hash
+    did not change skip parsing, the rest are parsed across a process pool
+    and written back to the cache.
+    """
+    processes=processes or os.cpu_count() or 1
+    jobs=iter(jobs)
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        while batch := list(islice(jobs,batchSize)):
+            fields=[None]*len(batch)
+            hashes=[None]*len(batch)
+            misses=[]
+            for i,job in enumerate(batch):
+                if cache is not None:
+                    hashes[i]=contentHash(job)
+                    fields[i]=cache.get(job['jobId'],hashes[i])
+                if fields[i] is None:
+                    misses.append(i)
+
+            # only the html fields are shipped to the workers
+            parsed=pool.map(
+                _normalizeFields,
+                [{field:batch[i].get(field) for field in HTML_FIELDS} for i in misses],
+                chunksize=chunksize)
+            for i,result in zip(misses,parsed):
+                fields[i]=result
+
+            if cache is not None and misses:
+                cache.putMany((batch[i]['jobId'],hashes[i],fields[i]) for i in misses)
+
+            for job,normalized in zip(batch,fields):
+                yield {**job,**normalized}
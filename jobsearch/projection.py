@@ -0,0 +1,107 @@
+import os
+from typing import Callable, Iterable, Iterator, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from jobsearch.vectorstore import normalizeRows, topK
+
+class PCAProjection:
+    """
+    Linear projection of embeddings onto their top `dim` principal directions.
+
+    The components come from an SVD of the (uncentered) sample matrix, so
+    inner products and cosine similarities between projected vectors stay
+    as close as possible to those of the full-width vectors.
+    """
+    def __init__(self, components:np.ndarray, explained:Optional[np.ndarray]=None):
+        # (dim, full width)
+        self.components=np.asarray(components,dtype=np.float32)
+        self.explained=explained
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, vectors:np.ndarray, dim:int) -> "PCAProjection":
+        vectors=np.asarray(vectors,dtype=np.float32)
+        if dim > min(vectors.shape):
+            raise ValueError(f"cannot fit {dim} components on {vectors.shape[0]} vectors of width {vectors.shape[1]}")
+        _,singular,vt=np.linalg.svd(vectors,full_matrices=False)
+        energy=singular**2
+        return cls(vt[:dim],np.cumsum(energy)[:dim]/energy.sum())
+
+    def transform(self, vectors:np.ndarray) -> np.ndarray:
+        return np.asarray(vectors,dtype=np.float32) @ self.components.T
+
+    def save(self, path:str) -> None:
+        os.makedirs(os.path.dirname(path) or ".",exist_ok=True)
+        np.savez(path,components=self.components,explained=self.explained)
+
+    @classmethod
+    def load(cls, path:str) -> "PCAProjection":
+        with np.load(path) as state:
+            return cls(state['components'],state['explained'])
+
+def recallAtK(vectors:np.ndarray, projection:PCAProjection, k:int=10, queries:int=100, seed:int=1) -> float:
+    """
+    Recall@k of cosine search in the projected space against the full-width
+    baseline, `queries` of the vectors are searched among all of them.
+    """
+    vectors=normalizeRows(vectors)
+    projected=normalizeRows(projection.transform(vectors))
+    picks=np.random.default_rng(seed).choice(len(vectors),size=min(queries,len(vectors)),replace=False)
+    k=min(k,len(vectors))
+    exact=topK(vectors[picks] @ vectors.T,k)
+    approx=topK(projected[picks] @ projected.T,k)
+    return float(np.mean([len(set(a) & set(b))/k for a,b in zip(exact,approx)]))
+
+def loadOrFitProjection(path:str, dim:int, sample:Optional[Callable[[],np.ndarray]]=None) -> PCAProjection:
+    """Load the projection saved at `path`, or fit it on the vectors of sample(), save it and print its recall@10"""
+    if os.path.exists(path):
+        return PCAProjection.load(path)
+    if sample is None:
+        raise FileNotFoundError(f"{path} not found, fit the projection at ingest first")
+    vectors=sample()
+    if len(vectors) < dim:
+        raise ValueError(f"only {len(vectors)} sample embeddings to fit {dim} components, ingest without a projection first")
+    projection=PCAProjection.fit(vectors,dim)
+    projection.save(path)
+    print(f"fitted PCA to {dim} dims on {len(vectors)} embeddings, "
+        f"explained variance {projection.explained[-1]:.3f}, recall@10 against full width {recallAtK(vectors,projection):.3f}")
+    return projection
+
+class ProjectedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper applying a PCAProjection to document and query vectors.
+
+    Wrap outside of CachedEmbeddings, the cache then keeps the full-width
+    vectors and a new projection does not invalidate it.
+    """
+    def __init__(self, embeddings:Embeddings, projection:PCAProjection):
+        self.embeddings=embeddings
+        self.projection=projection
+
+    def embed_documents(self, texts:list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        return self.projection.transform(self.embeddings.embed_documents(texts)).tolist()
+
+    def embed_query(self, text:str) -> list[float]:
+        return self.projection.transform(self.embeddings.embed_query(text)).tolist()
+
+    def mapBatches(self, batches:Iterable[list[str]]) -> Iterator[list[list[float]]]:
+        """Projected form of the wrapped mapBatches (see embedBatches), batch by batch without one"""
+        if not hasattr(self.embeddings,'mapBatches'):
+            for texts in batches:
+                yield self.embed_documents(texts)
+            return
+        for vectors in self.embeddings.mapBatches(batches):
+            yield self.projection.transform(vectors).tolist() if vectors else []
+
+    async def aembed_documents(self, texts:list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        return self.projection.transform(await self.embeddings.aembed_documents(texts)).tolist()
+
+    async def aembed_query(self, text:str) -> list[float]:
+        return self.projection.transform(await self.embeddings.aembed_query(text)).tolist()
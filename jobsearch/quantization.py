@@ -0,0 +1,119 @@
+import json, os
+import numpy as np
+from jobsearch.ann import kmeans, nearestCentroids
+
+class ScalarQuantizer:
+    """
+    int8 scalar quantization, 4x smaller than float32.
+
+    Every dimension is mapped linearly from its [min, max] range, fitted on
+    the training vectors, onto the 256 int8 values. Inner products are
+    computed directly on the codes: x ~ offset + scale*(code+128).
+    """
+    kind="int8"
+
+    def __init__(self, offset:np.ndarray, scale:np.ndarray):
+        self.offset=np.asarray(offset,dtype=np.float32)
+        self.scale=np.asarray(scale,dtype=np.float32)
+
+    @classmethod
+    def train(cls, vectors:np.ndarray, **kwargs) -> "ScalarQuantizer":
+        vectors=np.asarray(vectors,dtype=np.float32)
+        low,high=vectors.min(axis=0),vectors.max(axis=0)
+        scale=(high-low)/255
+        scale[scale == 0]=1.0
+        return cls(low,scale)
+
+    def encode(self, vectors:np.ndarray) -> np.ndarray:
+        codes=np.rint((np.asarray(vectors,dtype=np.float32)-self.offset)/self.scale)
+        return (np.clip(codes,0,255)-128).astype(np.int8)
+
+    def decode(self, codes:np.ndarray) -> np.ndarray:
+        return self.offset+self.scale*(codes.astype(np.float32)+128)
+
+    def scores(self, codes:np.ndarray, vector:np.ndarray) -> np.ndarray:
+        """Approximate inner products of `vector` with the encoded rows"""
+        weights=(vector*self.scale).astype(np.float32)
+        # einsum converts the int8 codes in small buffered blocks, `codes @ weights`
+        # would first make a float32 copy of the whole code matrix
+        return np.einsum("ij,j->i",codes,weights)+float(vector @ self.offset+128*weights.sum())
+
+    def state(self) -> dict[str,np.ndarray]:
+        return {'offset':self.offset,'scale':self.scale}
+
+class ProductQuantizer:
+    """
+    Product quantization, one byte per subspace.
+
+    Vectors are cut into `subspaces` equal parts and every part is replaced
+    by the nearest of 256 k-means centroids trained for that part. With 32
+    subspaces a 3072-d float32 vector shrinks from 12KB to 32 bytes. A query
+    builds a (subspaces, 256) table of partial inner products once, the score
+    of a row is the sum of its table entries (asymmetric distance).
+    """
+    kind="pq"
+
+    def __init__(self, codebooks:np.ndarray):
+        # (subspaces, 256, subspace dimension)
+        self.codebooks=np.asarray(codebooks,dtype=np.float32)
+
+    @property
+    def subspaces(self) -> int:
+        return self.codebooks.shape[0]
+
+    @classmethod
+    def train(cls,
+        vectors:np.ndarray,
+        subspaces:int=32,
+        sampleSize:int=20000,
+        iterations:int=10,
+        seed:int=1) -> "ProductQuantizer":
+        vectors=np.asarray(vectors,dtype=np.float32)
+        if vectors.shape[1] % subspaces:
+            raise ValueError(f"dimension {vectors.shape[1]} is not a multiple of {subspaces} subspaces")
+        rng=np.random.default_rng(seed)
+        sample=vectors[rng.choice(len(vectors),size=min(sampleSize,len(vectors)),replace=False)]
+        parts=np.split(sample,subspaces,axis=1)
+        return cls(np.stack([kmeans(part,256,iterations,seed,spherical=False) for part in parts]))
+
+    def encode(self, vectors:np.ndarray) -> np.ndarray:
+        parts=np.split(np.asarray(vectors,dtype=np.float32),self.subspaces,axis=-1)
+        return np.stack([nearestCentroids(part,codebook,spherical=False) for part,codebook in zip(parts,self.codebooks)],axis=-1).astype(np.uint8)
+
+    def decode(self, codes:np.ndarray) -> np.ndarray:
+        return np.concatenate([codebook[codes[...,i]] for i,codebook in enumerate(self.codebooks)],axis=-1)
+
+    def scores(self, codes:np.ndarray, vector:np.ndarray) -> np.ndarray:
+        """Approximate inner products of `vector` with the encoded rows"""
+        parts=np.split(np.asarray(vector,dtype=np.float32),self.subspaces)
+        table=np.einsum("skd,sd->sk",self.codebooks,np.stack(parts))
+        scores=np.zeros(len(codes),dtype=np.float32)
+        for i in range(self.subspaces):
+            scores+=table[i][codes[:,i]]
+        return scores
+
+    def state(self) -> dict[str,np.ndarray]:
+        return {'codebooks':self.codebooks}
+
+QUANTIZERS={quantizer.kind:quantizer for quantizer in (ScalarQuantizer,ProductQuantizer)}
+
+def saveQuantizer(quantizer, codes:np.ndarray, path:str) -> None:
+    """Write the quantizer parameters and the codes of every row into directory `path`"""
+    os.makedirs(path,exist_ok=True)
+    np.savez(os.path.join(path,"quantizer.npz"),**quantizer.state())
+    np.save(os.path.join(path,"codes.npy"),codes)
+    with open(os.path.join(path,"quantizer.json"),"w") as file:
+        json.dump({'kind':quantizer.kind,'count':len(codes)},file)
+
+def loadQuantizer(path:str) -> tuple[object,np.ndarray]:
+    with open(os.path.join(path,"quantizer.json"),"r") as file:
+        info=json.load(file)
+    with np.load(os.path.join(path,"quantizer.npz")) as state:
+        quantizer=QUANTIZERS[info['kind']](**state)
+    return quantizer,np.load(os.path.join(path,"codes.npy"))
+
+def trainQuantizer(kind:str, vectors:np.ndarray, **kwargs):
+    """Train a quantizer by kind, "int8" or "pq" """
+    if kind not in QUANTIZERS:
+        raise ValueError(f"unknown quantizer {kind}, expected one of {', '.join(QUANTIZERS)}")
+    return QUANTIZERS[kind].train(vectors,**kwargs)
@@ -0,0 +1,173 @@
+import os
+from typing import Any, Optional
+from jobsearch.filters import DATE_FIELDS, parseDate
+
+# metadata fields of the redis job index, dates are indexed as days since
+# 1970-01-01 in "<field>Days" next to the original dd/mm/yyyy string.
+# Names can contain commas, the default tag separator, so they are split on
+# "|" instead (an index created with the old separator needs recreate=True)
+JOB_INDEX_FIELDS=[
+    {'name':'jobId','type':'tag'},
+    {'name':'employerId','type':'tag'},
+    {'name':'employerName','type':'tag','attrs':{'separator':'|'}},
+    {'name':'locationName','type':'tag','attrs':{'separator':'|'}},
+    {'name':'contractType','type':'tag'},
+    {'name':'jobTitle','type':'text'},
+    {'name':'fullTime','type':'numeric'},
+    {'name':'partTime','type':'numeric'},
+    {'name':'minimumSalary','type':'numeric'},
+    {'name':'maximumSalary','type':'numeric'},
+    {'name':'salaryCeiling','type':'numeric'},
+    {'name':'datePostedDays','type':'numeric'},
+    {'name':'expirationDateDays','type':'numeric'},
+    {'name':'chunkIndex','type':'numeric'},
+    {'name':'chunkCount','type':'numeric'},
+]
+
+# langchain_redis reads every schema field of a hit, but redis leaves out the
+# fields a hash does not have, so the writer stores each missing field as an
+# empty tag/text (never indexed) or this number (excluded by the range filters,
+# every numeric field of a job is >= 0)
+MISSING_NUMBER=-1
+
+def missingFields(record:dict) -> dict:
+    """The placeholder values of the JOB_INDEX_FIELDS missing from a record"""
+    return {
+        field['name']:MISSING_NUMBER if field['type'] == 'numeric' else ""
+        for field in JOB_INDEX_FIELDS if record.get(field['name']) is None
+    }
+
+def dateFields(metadata:dict) -> dict[str,float]:
+    """The numeric "<field>Days" values of the date fields of a job, stored next to the metadata"""
+    days={}
+    for field in DATE_FIELDS:
+        value=parseDate(metadata.get(field))
+        if value is not None:
+            days[f"{field}Days"]=value
+    return days
+
+def derivedFields(metadata:dict) -> dict[str,float]:
+    """
+    The numeric fields of a job computed for filtering, dateFields() and
+    salaryCeiling, the maximumSalary or the minimumSalary of a job without
+    a maximum (redis range filters never match a missing field).
+    """
+    fields=dateFields(metadata)
+    ceiling=metadata.get('maximumSalary')
+    if ceiling is None:
+        ceiling=metadata.get('minimumSalary')
+    if ceiling is not None:
+        fields['salaryCeiling']=ceiling
+    return fields
+
+def jobIndexSchema(
+    indexName:str="jobs",
+    dims:int=3072,
+    algorithm:str="hnsw",
+    m:int=16,
+    efConstruction:int=200,
+    efRuntime:int=10,
+    distanceMetric:str="cosine",
+    datatype:str="float32",
+    storageType:str="hash",
+    contentField:str="text",
+    embeddingField:str="embedding"):
+    """
+    redisvl IndexSchema of the job index.
+
+    algorithm is "hnsw" (m, efConstruction, efRuntime apply) or "flat"
+    (exact KNN, fine up to some 10k vectors). The metadata fields are
+    JOB_INDEX_FIELDS, so KNN queries can be filtered in redis.
+    """
+    from redisvl.schema import IndexSchema
+
+    algorithm=algorithm.lower()
+    if algorithm not in ("hnsw","flat"):
+        raise ValueError(f"unknown vector index algorithm {algorithm}, expected hnsw or flat")
+    vectorAttrs={'dims':dims,'algorithm':algorithm,'distance_metric':distanceMetric,'datatype':datatype}
+    if algorithm == "hnsw":
+        vectorAttrs.update({'m':m,'ef_construction':efConstruction,'ef_runtime':efRuntime})
+    return IndexSchema.from_dict({
+        'index':{'name':indexName,'prefix':indexName,'storage_type':storageType},
+        'fields':[
+            {'name':contentField,'type':'text'},
+            {'name':embeddingField,'type':'vector','attrs':vectorAttrs},
+            *JOB_INDEX_FIELDS,
+        ],
+    })
+
+def indexArgsFromEnv() -> dict:
+    """jobIndexSchema arguments from REDIS_INDEX_ALGORITHM, HNSW_M, HNSW_EF_CONSTRUCTION and HNSW_EF_RUNTIME"""
+    return {
+        'algorithm':os.environ.get("REDIS_INDEX_ALGORITHM","hnsw"),
+        'm':int(os.environ.get("HNSW_M","16")),
+        'efConstruction':int(os.environ.get("HNSW_EF_CONSTRUCTION","200")),
+        'efRuntime':int(os.environ.get("HNSW_EF_RUNTIME","10")),
+    }
+
+def jobVectorStore(embeddings, redisClient, indexName:str="jobs", recreate:bool=False, **schemaArgs):
+    """
+    RedisVectorStore over the declarative job index schema.
+
+    The vector dimension comes from embedding a dummy query. With recreate
+    the index is re-created with the current schema, keeping the stored
+    keys, so redis re-indexes them (e.g. after changing the HNSW parameters).
+    """
+    from langchain_redis import RedisConfig, RedisVectorStore
+
+    dims=len(embeddings.embed_query("dummy"))
+    schema=jobIndexSchema(indexName,dims,**schemaArgs)
+    vectorStore=RedisVectorStore(
+        embeddings=embeddings,
+        config=RedisConfig(schema=schema,redis_client=redisClient,embedding_dimensions=dims))
+    if recreate:
+        vectorStore.index.create(overwrite=True,drop=False)
+    return vectorStore
+
+def redisFilter(filter:Optional[dict]):
+    """
+    redisvl FilterExpression of a metadata filter dict, the same format as
+    the local MetadataIndex:
+
+        {'locationName':'London', 'fullTime':True,
+         'salary':(45000,55000), 'datePosted':('01/03/2025',None)}
+
+    'salary' matches jobs whose min/max salary range overlaps the range,
+    a job without a maximum only needs its minimum, as in MetadataIndex.
+    Jobs missing a field never match a condition on it.
+    """
+    from redisvl.query.filter import FilterExpression, Num, Tag
+
+    def numRange(field:str, low:Any, high:Any) -> Optional[FilterExpression]:
+        if low is None and high is None:
+            return None
+        # an open lower end still has to skip the MISSING_NUMBER placeholders
+        expression=Num(field) >= low if low is not None else Num(field) > MISSING_NUMBER
+        if high is not None:
+            expression=expression & (Num(field) <= high)
+        return expression
+
+    expressions=[]
+    for field,condition in (filter or {}).items():
+        if field == 'salary':
+            low,high=condition
+            expressions.append(numRange('minimumSalary',None,high))
+            expressions.append(numRange('salaryCeiling',low,None))
+        elif field in DATE_FIELDS:
+            low,high=condition
+            expressions.append(numRange(f"{field}Days",parseDate(low),parseDate(high)))
+        elif field in ('fullTime','partTime'):
+            expressions.append(Num(field) == int(bool(condition)))
+        elif field in ('minimumSalary','maximumSalary'):
+            expressions.append(numRange(field,*condition))
+        elif field in ('jobId','employerId','employerName','locationName','contractType'):
+            values=condition if isinstance(condition,(list,set,frozenset)) else [condition]
+            expressions.append(Tag(field) == [str(value) for value in values])
+        else:
+            raise ValueError(f"{field} is not a field of the redis job index")
+
+    combined=None
+    for expression in expressions:
+        if expression is not None:
+            combined=expression if combined is None else combined & expression
+    return combined
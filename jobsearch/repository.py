@@ -0,0 +1,149 @@
+import glob, json, os, re, threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterator, Optional
+from jobsearch.corpus import JobCorpus
+
+class CachedRepository(ABC):
+    """
+    In-process LRU of parsed records by id, in front of the agent tools.
+
+    Every entry remembers the version of its source (a file mtime, a corpus
+    location) and is reloaded once the version changes, so an edited file is
+    picked up without restarting. A lookup of an unchanged record is a dict
+    hit instead of reading and parsing it again. The returned records are
+    shared between callers, treat them as read-only.
+    """
+    def __init__(self, maxsize:int=1024):
+        self.maxsize=maxsize
+        self.hits=0
+        self.misses=0
+        # tool calls run concurrently on a thread pool
+        self._lock=threading.Lock()
+        self._entries=OrderedDict()
+
+    @abstractmethod
+    def _version(self, id:str) -> Optional[Hashable]:
+        """Version of the record, None if it does not exist"""
+
+    @abstractmethod
+    def _load(self, id:str) -> Any:
+        """Read and parse the record"""
+
+    @abstractmethod
+    def _records(self) -> Iterator[tuple[str,Hashable,Any]]:
+        """(id, version, record) of every record, for prewarm()"""
+
+    def _put(self, id:str, version:Hashable, record:Any) -> None:
+        with self._lock:
+            self._entries[id]=(version,record)
+            self._entries.move_to_end(id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, id:str) -> Any:
+        id=str(id)
+        version=self._version(id)
+        with self._lock:
+            entry=self._entries.get(id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(id)
+                self.hits+=1
+                return entry[1]
+            self.misses+=1
+            self._entries.pop(id,None)
+        record=self._load(id)
+        if version is not None:
+            self._put(id,version,record)
+        return record
+
+    def prewarm(self) -> int:
+        """Load every record up to maxsize into the cache, returns the number loaded"""
+        count=0
+        for id,version,record in self._records():
+            if count >= self.maxsize:
+                break
+            self._put(id,version,record)
+            count+=1
+        return count
+
+    def invalidate(self, id:Optional[str]=None) -> None:
+        with self._lock:
+            if id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(id),None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def hitRate(self) -> float:
+        total=self.hits+self.misses
+        return self.hits/total if total else 0.0
+
+    def stats(self) -> dict:
+        return {'size':len(self._entries),'hits':self.hits,'misses':self.misses,'hitRate':round(self.hitRate(),3)}
+
+class JsonFileRepository(CachedRepository):
+    """
+    Json files of a path template like "data/cand_{id}.json", invalidated by
+    the mtime and size of the file. A missing file raises FileNotFoundError
+    as open() would.
+    """
+    def __init__(self, template:str, maxsize:int=1024, prewarm:bool=False):
+        super().__init__(maxsize)
+        self.template=template
+        if prewarm:
+            self.prewarm()
+
+    def _path(self, id:str) -> str:
+        return self.template.format(id=id)
+
+    def _version(self, id:str) -> Optional[Hashable]:
+        try:
+            stat=os.stat(self._path(id))
+        except OSError:
+            return None
+        return (stat.st_mtime_ns,stat.st_size)
+
+    def _load(self, id:str) -> Any:
+        with open(self._path(id),'r') as file:
+            return json.load(file)
+
+    def _records(self) -> Iterator[tuple[str,Hashable,Any]]:
+        prefix,suffix=self.template.split("{id}")
+        pattern=re.compile(re.escape(prefix)+"(.+)"+re.escape(suffix)+"$")
+        for path in sorted(glob.glob(glob.escape(prefix)+"*"+glob.escape(suffix))):
+            if match := pattern.match(path):
+                id=match.group(1)
+                version=self._version(id)
+                if version is not None:
+                    yield id,version,self._load(id)
+
+class CorpusRepository(CachedRepository):
+    """
+    Records of a JobCorpus passed through `transform` (e.g. normalizeJob, which
+    parses the html fields), invalidated when the job is put again. Every
+    lookup refreshes the corpus index first, so jobs re-crawled or compacted
+    by another process are picked up. A missing job returns None as
+    JobCorpus.get() does.
+    """
+    def __init__(self, corpus:JobCorpus, transform:Callable[[dict],Any]=lambda doc: doc, maxsize:int=1024, prewarm:bool=False):
+        super().__init__(maxsize)
+        self.corpus=corpus
+        self.transform=transform
+        if prewarm:
+            self.prewarm()
+
+    def _version(self, id:str) -> Optional[Hashable]:
+        self.corpus.refresh()
+        return self.corpus.location(id)
+
+    def _load(self, id:str) -> Any:
+        doc=self.corpus.get(id)
+        return None if doc is None else self.transform(doc)
+
+    def _records(self) -> Iterator[tuple[str,Hashable,Any]]:
+        self.corpus.refresh()
+        for id,doc in self.corpus.scan():
+            yield id,self.corpus.location(id),self.transform(doc)
@@ -0,0 +1,161 @@
+import heapq, json, os, re, threading, zlib
+import multiprocessing as mp
+from itertools import islice
+from typing import Any, Optional, Sequence
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from jobsearch.vectorstore import MatrixVectorStore
+
+# shard directories, without the .tmp/.old ones of an interrupted save
+SHARD_DIR=re.compile(r"shard-\d+")
+
+def shardOf(doc:Document, shards:int, by:str="jobId") -> int:
+    """
+    Shard of a document by the crc32 of a metadata field. The default jobId
+    keeps all chunks of a job in one shard, by="locationName" shards by region.
+    """
+    value=doc.metadata.get(by,doc.id)
+    return zlib.crc32(str(value).encode("utf-8")) % shards
+
+def shardStore(store:MatrixVectorStore, shards:int, by:str="jobId") -> list[MatrixVectorStore]:
+    """Partition the rows of a store into `shards` new stores"""
+    rows=[[] for _ in range(shards)]
+    for row in range(len(store)):
+        rows[shardOf(store._document(row),shards,by)].append(row)
+    parts=[]
+    for shardRows in rows:
+        part=MatrixVectorStore(store.embedding)
+        if shardRows:
+            part.add_embeddings([store._document(row) for row in shardRows],store.matrix[shardRows])
+        parts.append(part)
+    return parts
+
+def shardPath(path:str, shard:int) -> str:
+    return os.path.join(path,f"shard-{shard:03d}")
+
+def _sourceVersion(source:str) -> list[int]:
+    # every save of a store rewrites its index.json
+    stat=os.stat(os.path.join(source,"index.json"))
+    return [stat.st_mtime_ns,stat.st_size]
+
+def saveShards(stores:list[MatrixVectorStore], path:str, source:Optional[str]=None) -> None:
+    """
+    Save the shards into shard-000, shard-001, ... of path. With `source`,
+    the directory of the store they were split from, shardsCurrent() can
+    tell later whether they are still up to date.
+    """
+    marker=os.path.join(path,"source.json")
+    if os.path.exists(marker):
+        os.remove(marker)
+    for shard,store in enumerate(stores):
+        store.save(shardPath(path,shard))
+    if source is not None:
+        # written last, shards of an interrupted save are never current
+        with open(marker+".tmp","w") as file:
+            json.dump({'source':source,'shards':len(stores),'version':_sourceVersion(source)},file)
+        os.replace(marker+".tmp",marker)
+
+def shardsCurrent(path:str, source:str, shards:int) -> bool:
+    """True if path holds `shards` shards saved from the store as it is now saved in `source`"""
+    try:
+        with open(os.path.join(path,"source.json"),"r") as file:
+            marker=json.load(file)
+        return marker == {'source':source,'shards':shards,'version':_sourceVersion(source)}
+    except (OSError,ValueError):
+        return False
+
+def mergeTopK(results:Sequence[list[tuple[Document,float]]], k:int) -> list[tuple[Document,float]]:
+    """Merge per-shard (Document, score) lists, each best first, into the overall top k"""
+    return list(islice(heapq.merge(*results,key=lambda result: -result[1]),k))
+
+def _shardWorker(conn, path:str) -> None:
+    # runs in its own process, the shard is memory-mapped so loading is cheap
+    store=MatrixVectorStore.load(path,None)
+    while True:
+        message=conn.recv()
+        if message is None:
+            return
+        command,args=message
+        try:
+            if command == "search":
+                vectors,k,kwargs=args
+                conn.send(store.batch_similarity_search_with_score_by_vector(vectors,k=k,**kwargs))
+            elif command == "reload":
+                store=MatrixVectorStore.load(path,None)
+                conn.send(len(store))
+            elif command == "len":
+                conn.send(len(store))
+        except Exception as e:
+            conn.send(e)
+
+class ShardedSearcher:
+    """
+    Scatter-gather search over the shards saved by saveShards, one worker process per shard.
+
+    A query is embedded once, its vector is sent to every shard, each
+    worker returns its own top k and the results are merged with a heap.
+    The shards search in parallel on separate cores. replaceShard() swaps
+    in a rebuilt shard while the other shards keep serving. Filters must be
+    dicts (see MetadataIndex), callables cannot be sent to the workers.
+    """
+    def __init__(self, path:str, embedding:Embeddings, shards:Optional[int]=None):
+        self.path=path
+        self.embedding=embedding
+        if shards is None:
+            shards=len([name for name in os.listdir(path) if SHARD_DIR.fullmatch(name)])
+        self._lock=threading.Lock()
+        self._conns=[]
+        self._workers=[]
+        for shard in range(shards):
+            parent,child=mp.Pipe()
+            worker=mp.Process(target=_shardWorker,args=(child,shardPath(path,shard)),name=f"shard-{shard}",daemon=True)
+            worker.start()
+            self._conns.append(parent)
+            self._workers.append(worker)
+
+    def _gather(self, shards:Sequence[int], message:tuple) -> list:
+        with self._lock:
+            for shard in shards:
+                self._conns[shard].send(message)
+            results=[self._conns[shard].recv() for shard in shards]
+        for result in results:
+            if isinstance(result,Exception):
+                raise result
+        return results
+
+    def __len__(self) -> int:
+        return sum(self._gather(range(len(self._conns)),("len",None)))
+
+    def batch_similarity_search_with_score_by_vector(self, embeddings:Sequence[Sequence[float]], k:int=4, **kwargs:Any) -> list[list[tuple[Document,float]]]:
+        vectors=[list(map(float,vector)) for vector in embeddings]
+        perShard=self._gather(range(len(self._conns)),("search",(vectors,k,kwargs)))
+        return [mergeTopK([shard[i] for shard in perShard],k) for i in range(len(vectors))]
+
+    def similarity_search_with_score_by_vector(self, embedding:list[float], k:int=4, **kwargs:Any) -> list[tuple[Document,float]]:
+        return self.batch_similarity_search_with_score_by_vector([embedding],k=k,**kwargs)[0]
+
+    def similarity_search_with_score(self, query:str, k:int=4, **kwargs:Any) -> list[tuple[Document,float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query),k=k,**kwargs)
+
+    def similarity_search(self, query:str, k:int=4, **kwargs:Any) -> list[Document]:
+        return [doc for doc,_ in self.similarity_search_with_score(query,k=k,**kwargs)]
+
+    def replaceShard(self, shard:int, store:MatrixVectorStore) -> None:
+        """Save a rebuilt shard over the old one and reload only that worker"""
+        # save() swaps in the whole directory, the worker keeps searching the
+        # memory-mapped files of the old one until it reloads
+        store.save(shardPath(self.path,shard))
+        self._gather([shard],("reload",None))
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._conns:
+                conn.send(None)
+        for worker in self._workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
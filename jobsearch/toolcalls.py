@@ -0,0 +1,144 @@
+import threading, time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Optional
+from langchain_core.messages import ToolMessage
+
+class ToolExecutor:
+    """
+    Runs the tool calls of one model turn concurrently on a thread pool.
+
+    Results come back in the order of the calls, whatever order they finish
+    in, so the messages handed back to the model are deterministic. At most
+    `limits[name]` (default `defaultLimit`) calls of a tool run at once,
+    e.g. to keep a vector store or an API from being hammered. Calls wait in
+    a queue per tool until their tool has a free slot, they only take a pool
+    thread once they start, so a saturated tool does not hold up the others.
+
+    A turn waits at most `timeout` seconds for its calls. A call that has not
+    started by then is dropped, one still running is reported through
+    onTimeout and abandoned. Threads cannot be interrupted, an abandoned call
+    keeps its thread and its tool slot until it returns by itself, so tools
+    should bound their own I/O (http timeouts etc). Up to `maxAbandoned`
+    abandoned calls run on extra threads, beyond that they take the threads
+    of new calls.
+    """
+    def __init__(self,
+        maxWorkers:int=8,
+        limits:Optional[dict[str,int]]=None,
+        defaultLimit:int=4,
+        timeout:Optional[float]=60.0,
+        maxAbandoned:Optional[int]=None):
+        self.maxWorkers=maxWorkers
+        self.limits=dict(limits or {})
+        self.defaultLimit=defaultLimit
+        self.timeout=timeout
+        self.maxAbandoned=maxWorkers if maxAbandoned is None else maxAbandoned
+        self._pool=ThreadPoolExecutor(max_workers=maxWorkers+self.maxAbandoned,thread_name_prefix="tool")
+        self._lock=threading.Lock()
+        self._queues={}
+        self._running={}
+        # calls running for a turn that still waits for them, and the abandoned ones
+        self._active=0
+        self._abandoned=set()
+
+    @property
+    def abandoned(self) -> int:
+        """Number of timed out calls still running"""
+        return len(self._abandoned)
+
+    def _dispatch(self) -> None:
+        # with the lock held, starts queued calls while their tool and the pool have free slots
+        for name,queue in self._queues.items():
+            limit=self.limits.get(name,self.defaultLimit)
+            while queue and self._running.get(name,0) < limit and self._active < self.maxWorkers \
+                    and self._active+len(self._abandoned) < self.maxWorkers+self.maxAbandoned:
+                call,future=queue.popleft()
+                # false if the turn timed out while the call was queued
+                if future.set_running_or_notify_cancel():
+                    self._running[name]=self._running.get(name,0)+1
+                    self._active+=1
+                    self._pool.submit(self._call,name,call,future)
+
+    def _call(self, name:str, call:Callable[[],Any], future:Future) -> None:
+        try:
+            future.set_result(call())
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._running[name]-=1
+                if future in self._abandoned:
+                    self._abandoned.discard(future)
+                else:
+                    self._active-=1
+                self._dispatch()
+
+    def _abandon(self, future:Future) -> None:
+        with self._lock:
+            # a queued call is just dropped, a running one frees its place for new calls
+            if not future.cancel() and not future.done():
+                self._abandoned.add(future)
+                self._active-=1
+                self._dispatch()
+
+    def run(self, calls:list[tuple[str,Callable[[],Any]]], onTimeout:Optional[Callable[[int],Any]]=None) -> list:
+        """
+        Run (tool name, callable) pairs and return their results in call order.
+
+        The result of a timed out call is onTimeout(index of the call), without
+        onTimeout a TimeoutError is raised. An exception of a call is raised
+        once every call has finished or timed out.
+        """
+        futures=[]
+        with self._lock:
+            for name,call in calls:
+                future=Future()
+                self._queues.setdefault(name,deque()).append((call,future))
+                futures.append(future)
+            self._dispatch()
+        deadline=None if self.timeout is None else time.monotonic()+self.timeout
+        results=[]
+        error=None
+        for i,future in enumerate(futures):
+            try:
+                results.append(future.result(timeout=None if deadline is None else max(0.0,deadline-time.monotonic())))
+            except FutureTimeout:
+                self._abandon(future)
+                if onTimeout is None:
+                    error=error or TimeoutError(f"tool {calls[i][0]} did not finish in {self.timeout}s")
+                    results.append(None)
+                else:
+                    results.append(onTimeout(i))
+            except Exception as e:
+                error=error or e
+                results.append(None)
+        if error is not None:
+            raise error
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            for queue in self._queues.values():
+                for _,future in queue:
+                    future.cancel()
+                queue.clear()
+        self._pool.shutdown(wait=False,cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def invokeToolCalls(executor:ToolExecutor, toolsDict:dict, toolCalls:list[dict]) -> list[ToolMessage]:
+    """ToolMessages of the langchain tool calls of an AIMessage, run concurrently, in call order"""
+    def timedOut(i:int) -> ToolMessage:
+        t=toolCalls[i]
+        return ToolMessage(
+            content=f"{t['name']} did not answer within {executor.timeout}s",
+            name=t['name'],tool_call_id=t['id'],status="error")
+
+    return executor.run(
+        [(t['name'],lambda tool=toolsDict[t['name']],t=t: tool.invoke(t)) for t in toolCalls],
+        onTimeout=timedOut)
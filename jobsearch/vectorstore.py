@@ -0,0 +1,465 @@
+from typing import Any, Callable, Iterable, Optional, Sequence
+import json, mmap, os, shutil, tempfile, uuid
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from jobsearch.ann import IVFIndex
+from jobsearch.filters import MetadataIndex
+from jobsearch.quantization import loadQuantizer, saveQuantizer, trainQuantizer
+
+def normalizeRows(vectors:np.ndarray) -> np.ndarray:
+    """L2-normalize float32 row vectors, zero vectors stay zero"""
+    vectors=np.asarray(vectors,dtype=np.float32)
+    norms=np.linalg.norm(vectors,axis=-1,keepdims=True)
+    norms[norms == 0]=1.0
+    return vectors/norms
+
+def topK(scores:np.ndarray, k:int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without sorting the whole array"""
+    if k >= scores.shape[-1]:
+        return np.argsort(-scores,axis=-1)
+    top=np.argpartition(-scores,k-1,axis=-1)[...,:k]
+    order=np.argsort(-np.take_along_axis(scores,top,axis=-1),axis=-1)
+    return np.take_along_axis(top,order,axis=-1)
+
+def maximalMarginalRelevance(query:Sequence[float], candidates:np.ndarray, k:int=4, lambdaMult:float=0.5) -> list[int]:
+    """
+    Indices of the k candidates picked by maximal marginal relevance, in pick order.
+
+    All query and pairwise cosine similarities come from one matrix product,
+    each greedy step is then one O(n) numpy update of the highest similarity
+    of every candidate to the picks so far, no python loop over candidates.
+    """
+    candidates=normalizeRows(candidates)
+    if len(candidates) == 0 or k <= 0:
+        return []
+    relevance=candidates @ normalizeRows(query)
+    similarity=candidates @ candidates.T
+    picked=np.zeros(len(candidates),dtype=bool)
+    selected=[int(np.argmax(relevance))]
+    picked[selected[0]]=True
+    redundancy=similarity[selected[0]].copy()
+    while len(selected) < min(k,len(candidates)):
+        scores=lambdaMult*relevance-(1-lambdaMult)*redundancy
+        scores[picked]=-np.inf
+        best=int(np.argmax(scores))
+        selected.append(best)
+        picked[best]=True
+        np.maximum(redundancy,similarity[best],out=redundancy)
+    return selected
+
+def mmrResults(query:Sequence[float], results:Sequence[tuple], k:int=4, lambdaMult:float=0.5) -> list[Document]:
+    """
+    MMR over search results that already carry their vectors, e.g. the
+    (Document, score, vector) tuples of a langchain_redis search with
+    with_vectors=True, so the candidates are neither fetched nor embedded again.
+    """
+    if not results:
+        return []
+    selected=maximalMarginalRelevance(query,np.array([result[-1] for result in results],dtype=np.float32),k,lambdaMult)
+    return [results[i][0] for i in selected]
+
+def replaceDirectory(src:str, dst:str) -> None:
+    """
+    Swap the fully written directory `src` in as `dst`. The old `dst` is
+    parked as dst.old until the swap is done, recoverDirectory() puts it
+    back if a crash happened in between.
+    """
+    shutil.rmtree(dst+".old",ignore_errors=True)
+    if os.path.exists(dst):
+        os.replace(dst,dst+".old")
+    os.replace(src,dst)
+    shutil.rmtree(dst+".old",ignore_errors=True)
+
+def recoverDirectory(path:str) -> None:
+    if not os.path.exists(path) and os.path.exists(path+".old"):
+        os.replace(path+".old",path)
+
+class _DocSidecar:
+    """
+    Read-only, lazily parsed view of the docs.jsonl sidecar of a saved store.
+
+    The file is memory-mapped and `offsets` marks where each row's json line
+    starts, so only the rows that are actually returned get parsed.
+    """
+    def __init__(self, path:str, offsets:np.ndarray):
+        self._file=open(path,"rb")
+        self._mmap=mmap.mmap(self._file.fileno(),0,access=mmap.ACCESS_READ) if offsets[-1] else b""
+        self._offsets=offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)-1
+
+    def __getitem__(self, row:int) -> dict:
+        return json.loads(self._mmap[self._offsets[row]:self._offsets[row+1]])
+
+class MatrixVectorStore(VectorStore):
+    """
+    In-memory vector store keeping every embedding in one float32 matrix.
+
+    Drop-in replacement for langchain's InMemoryVectorStore. Rows are
+    L2-normalized on insert, so a query is scored against the whole corpus
+    with one matrix-vector product (cosine similarity) and the top k are
+    picked with argpartition. The matrix grows by doubling its capacity, so
+    adding documents one batch at a time stays amortized O(1) per row.
+
+    save() writes the matrix as a raw float32 file next to an ids array and
+    a json lines sidecar of the texts and metadata. load() memory-maps them
+    read-only, so opening a saved index costs no parsing and several worker
+    processes share the same pages through the OS page cache. The first
+    write to a loaded store copies it into memory.
+
+    buildIndex() adds an IVFIndex, searches then only score the rows of the
+    clusters nearest to the query instead of the whole matrix. Pass
+    nprobe=... to a search to override the index default.
+
+    quantize() adds int8 or product quantized codes of every row, searches
+    then scan the codes and re-rank the best k*rerank candidates with the
+    full vectors (rerank=0 returns the approximate scores). Only the codes
+    have to be in RAM: the full vectors stay memory-mapped after load(), and
+    quantize() moves those of an in-memory store into a temporary
+    memory-mapped file, so only the re-ranked rows are read.
+
+    filter is either a callable on the Document or a dict evaluated by the
+    MetadataIndex (see jobsearch.filters), the dict form only scores the
+    rows passing the filter.
+    """
+    def __init__(self, embedding:Embeddings, initialCapacity:int=1024):
+        self.embedding=embedding
+        self._initialCapacity=initialCapacity
+        self._matrix=None
+        self._size=0
+        self._ids=[]
+        self._texts=[]
+        self._metadatas=[]
+        self._rows={}
+        self._sidecar=None
+        self.index=None
+        self.quantizer=None
+        self.rerank=4
+        self._codes=None
+        self.metadataIndex=MetadataIndex()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """View of the normalized embeddings, one row per document"""
+        if self._matrix is None:
+            return np.empty((0,0),dtype=np.float32)
+        return self._matrix[:self._size]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def buildIndex(self, nlist:Optional[int]=None, nprobe:int=8, **kwargs:Any) -> IVFIndex:
+        """Train an IVF index on the current rows, later inserts are assigned to it incrementally"""
+        if self._size == 0:
+            raise ValueError("cannot build an index on an empty store")
+        self.index=IVFIndex.train(self.matrix,nlist=nlist,nprobe=nprobe,**kwargs)
+        return self.index
+
+    def quantize(self, kind:str="int8", rerank:int=4, **kwargs:Any):
+        """Train an "int8" (4x smaller) or "pq" (product quantization) quantizer on the current rows"""
+        if self._size == 0:
+            raise ValueError("cannot quantize an empty store")
+        self.quantizer=trainQuantizer(kind,self.matrix,**kwargs)
+        self.rerank=rerank
+        self._codes=self.quantizer.encode(self.matrix)
+        if self._matrix.flags.writeable and not isinstance(self._matrix,np.memmap):
+            # only re-ranking reads the full vectors, move them out of RAM
+            spilled=self._allocate(*self._matrix.shape)
+            spilled[:self._size]=self._matrix[:self._size]
+            self._matrix=spilled
+        return self.quantizer
+
+    def _allocate(self, capacity:int, dim:int) -> np.ndarray:
+        """Zeroed float matrix, in a temporary memory-mapped file for a quantized store"""
+        if self.quantizer is None:
+            return np.zeros((capacity,dim),dtype=np.float32)
+        return np.memmap(tempfile.TemporaryFile(),dtype=np.float32,mode="w+",shape=(capacity,dim))
+
+    def _appendCodes(self, vectors:np.ndarray) -> None:
+        codes=self.quantizer.encode(vectors)
+        start=self._size-len(codes)
+        if self._size > len(self._codes):
+            grown=np.empty((max(2*len(self._codes),self._size),*codes.shape[1:]),dtype=codes.dtype)
+            grown[:start]=self._codes[:start]
+            self._codes=grown
+        self._codes[start:self._size]=codes
+
+    def _ensureWritable(self) -> None:
+        if self._sidecar is not None:
+            docs=[self._sidecar[row] for row in range(self._size)]
+            self._texts=[doc['text'] for doc in docs]
+            self._metadatas=[doc['metadata'] for doc in docs]
+            self._sidecar=None
+        if self._matrix is not None and not self._matrix.flags.writeable:
+            writable=self._allocate(*self._matrix.shape)
+            writable[:self._size]=self._matrix[:self._size]
+            self._matrix=writable
+
+    def _reserve(self, rows:int, dim:int) -> None:
+        self._ensureWritable()
+        if self._matrix is None:
+            self._matrix=self._allocate(max(self._initialCapacity,rows),dim)
+        elif self._matrix.shape[1] != dim:
+            raise ValueError(f"embedding dimension {dim} does not match the store dimension {self._matrix.shape[1]}")
+        elif self._size+rows > self._matrix.shape[0]:
+            capacity=max(self._matrix.shape[0]*2,self._size+rows)
+            grown=self._allocate(capacity,dim)
+            grown[:self._size]=self._matrix[:self._size]
+            self._matrix=grown
+
+    def add_embeddings(self, docs:Sequence[Document], vectors:Sequence[Sequence[float]]) -> list[str]:
+        """Add documents with pre-computed embeddings, an existing id is overwritten"""
+        if not docs:
+            return []
+        vectors=normalizeRows(vectors)
+        ids=[doc.id or str(uuid.uuid4()) for doc in docs]
+        # the last document of an id repeated within the batch wins, so every row
+        # updated in place below existed before the batch (and is in the indexes)
+        last={docId:i for i,docId in enumerate(ids)}
+        self._reserve(len(last),vectors.shape[1])
+        newRows=[]
+        for docId,i in last.items():
+            doc,vector=docs[i],vectors[i]
+            row=self._rows.get(docId)
+            if row is None:
+                row=self._size
+                self._size+=1
+                self._rows[docId]=row
+                self._ids.append(docId)
+                self._texts.append(doc.page_content)
+                self._metadatas.append(doc.metadata)
+                newRows.append(row)
+            else:
+                self._texts[row]=doc.page_content
+                self._metadatas[row]=doc.metadata
+                self.metadataIndex.set(row,doc.metadata)
+                if self.index is not None:
+                    self.index.update(row,vector)
+                if self.quantizer is not None:
+                    self._codes[row]=self.quantizer.encode(vector)
+            self._matrix[row]=vector
+        self.metadataIndex.append([self._metadatas[row] for row in newRows])
+        if self.index is not None and newRows:
+            self.index.append(self._matrix[newRows])
+        if self.quantizer is not None and newRows:
+            self._appendCodes(self._matrix[newRows])
+        return ids
+
+    def add_texts(self, texts:Iterable[str], metadatas:Optional[list[dict]]=None, ids:Optional[list[str]]=None, **kwargs:Any) -> list[str]:
+        texts=list(texts)
+        metadatas=metadatas or [{} for _ in texts]
+        ids=ids or [None]*len(texts)
+        docs=[Document(id=docId,page_content=text,metadata=metadata) for text,metadata,docId in zip(texts,metadatas,ids)]
+        return self.add_embeddings(docs,self.embedding.embed_documents(texts))
+
+    def delete(self, ids:Optional[Sequence[str]]=None, **kwargs:Any) -> None:
+        self._ensureWritable()
+        # swap the last row into the hole so the matrix stays contiguous
+        for docId in ids or []:
+            row=self._rows.pop(docId,None)
+            if row is None:
+                continue
+            last=self._size-1
+            if row != last:
+                self._matrix[row]=self._matrix[last]
+                self._ids[row]=self._ids[last]
+                self._texts[row]=self._texts[last]
+                self._metadatas[row]=self._metadatas[last]
+                self._rows[self._ids[row]]=row
+                self.metadataIndex.move(last,row)
+                if self.index is not None:
+                    self.index.move(last,row)
+                if self.quantizer is not None:
+                    self._codes[row]=self._codes[last]
+            self.metadataIndex.truncate(last)
+            if self.index is not None:
+                self.index.truncate(last)
+            self._ids.pop()
+            self._texts.pop()
+            self._metadatas.pop()
+            self._size=last
+
+    def _select_relevance_score_fn(self) -> Callable[[float],float]:
+        # scores are cosine similarities already
+        return lambda score: score
+
+    def _document(self, row:int) -> Document:
+        if self._sidecar is not None:
+            doc=self._sidecar[row]
+            return Document(id=self._ids[row],page_content=doc['text'],metadata=doc['metadata'])
+        return Document(id=self._ids[row],page_content=self._texts[row],metadata=self._metadatas[row])
+
+    def get_by_ids(self, ids:Sequence[str], /) -> list[Document]:
+        return [self._document(self._rows[docId]) for docId in ids if docId in self._rows]
+
+    def _scores(self, vectors:np.ndarray, filter:Optional[Callable[[Document],bool]]=None) -> np.ndarray:
+        scores=vectors @ self.matrix.T
+        if filter is not None:
+            mask=np.array([filter(self._document(row)) for row in range(self._size)],dtype=bool)
+            scores[...,~mask]=-np.inf
+        return scores
+
+    def _search(self,
+        vectors:np.ndarray,
+        k:int,
+        filter:Optional[Callable[[Document],bool]|dict]=None,
+        nprobe:Optional[int]=None,
+        rerank:Optional[int]=None) -> list[tuple[np.ndarray,np.ndarray]]:
+        """(rows, scores) of the top k of each normalized query vector, best first"""
+        mask=self.metadataIndex.mask(filter) if isinstance(filter,dict) else None
+        if self.index is None and self.quantizer is None:
+            if mask is None:
+                scores=self._scores(vectors,filter)
+                top=topK(scores,k)
+                return [(rows,np.take(queryScores,rows)) for rows,queryScores in zip(top,scores)]
+            # only the rows passing the metadata filter are scored
+            rows=np.flatnonzero(mask)
+            scores=vectors @ self.matrix[rows].T
+            top=topK(scores,k)
+            return [(rows[queryTop],np.take(queryScores,queryTop)) for queryTop,queryScores in zip(top,scores)]
+
+        rerank=self.rerank if rerank is None else rerank
+        if self.index is not None:
+            candidates=self.index.candidates(vectors,nprobe)
+        elif mask is not None or filter is not None:
+            candidates=[np.arange(self._size) if mask is None else np.flatnonzero(mask)]*len(vectors)
+        else:
+            # every row, the codes are scanned in place instead of gathered
+            candidates=[None]*len(vectors)
+        results=[]
+        for vector,rows in zip(vectors,candidates):
+            if rows is None:
+                scores=self.quantizer.scores(self._codes[:self._size],vector)
+                rows=np.arange(self._size)
+            else:
+                if mask is not None:
+                    rows=rows[mask[rows]]
+                elif filter is not None:
+                    rows=rows[np.array([filter(self._document(row)) for row in rows],dtype=bool)]
+                scores=self.matrix[rows] @ vector if self.quantizer is None else self.quantizer.scores(self._codes[rows],vector)
+            if self.quantizer is not None and rerank:
+                # exact scores for the best approximate candidates
+                top=topK(scores,k*rerank)
+                rows=rows[top]
+                scores=self.matrix[rows] @ vector
+            top=topK(scores,k)
+            results.append((rows[top],scores[top]))
+        return results
+
+    def batch_similarity_search_with_score_by_vector(
+        self,
+        embeddings:Sequence[Sequence[float]],
+        k:int=4,
+        filter:Optional[Callable[[Document],bool]|dict]=None,
+        nprobe:Optional[int]=None,
+        rerank:Optional[int]=None) -> list[list[tuple[Document,float]]]:
+        """Top k of several queries at once, one matrix-matrix product for all of them"""
+        if self._size == 0:
+            return [[] for _ in embeddings]
+        return [
+            [(self._document(row),float(score)) for row,score in zip(rows,scores) if np.isfinite(score)]
+            for rows,scores in self._search(normalizeRows(embeddings),k,filter,nprobe,rerank)
+        ]
+
+    def batch_similarity_search_with_score(self, queries:Sequence[str], k:int=4, **kwargs:Any) -> list[list[tuple[Document,float]]]:
+        vectors=[self.embedding.embed_query(query) for query in queries]
+        return self.batch_similarity_search_with_score_by_vector(vectors,k=k,**kwargs)
+
+    def similarity_search_with_score_by_vector(self, embedding:list[float], k:int=4, **kwargs:Any) -> list[tuple[Document,float]]:
+        return self.batch_similarity_search_with_score_by_vector([embedding],k=k,**kwargs)[0]
+
+    def similarity_search_with_score(self, query:str, k:int=4, **kwargs:Any) -> list[tuple[Document,float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query),k=k,**kwargs)
+
+    def similarity_search_by_vector(self, embedding:list[float], k:int=4, **kwargs:Any) -> list[Document]:
+        return [doc for doc,_ in self.similarity_search_with_score_by_vector(embedding,k=k,**kwargs)]
+
+    def similarity_search(self, query:str, k:int=4, **kwargs:Any) -> list[Document]:
+        return [doc for doc,_ in self.similarity_search_with_score(query,k=k,**kwargs)]
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding:list[float],
+        k:int=4,
+        fetch_k:int=20,
+        lambda_mult:float=0.5,
+        **kwargs:Any) -> list[Document]:
+        candidates=self.similarity_search_with_score_by_vector(embedding,k=fetch_k,**kwargs)
+        if not candidates:
+            return []
+        rows=[self._rows[doc.id] for doc,_ in candidates]
+        selected=maximalMarginalRelevance(embedding,self.matrix[rows],k,lambda_mult)
+        return [candidates[i][0] for i in selected]
+
+    def max_marginal_relevance_search(self, query:str, k:int=4, fetch_k:int=20, lambda_mult:float=0.5, **kwargs:Any) -> list[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding.embed_query(query),k=k,fetch_k=fetch_k,lambda_mult=lambda_mult,**kwargs)
+
+    def save(self, path:str) -> None:
+        """
+        Write vectors.f32, ids.npy, docs.jsonl, offsets.npy and index.json into directory `path`.
+        The files are written into path.tmp first and the directory is swapped in
+        as a whole, so a crash never leaves files of different saves side by side.
+        """
+        tmp=path+".tmp"
+        shutil.rmtree(tmp,ignore_errors=True)
+        os.makedirs(tmp)
+        dim=self.matrix.shape[1] if self._size else 0
+
+        offsets=np.zeros(self._size+1,dtype=np.int64)
+        with open(os.path.join(tmp,"vectors.f32"),"wb") as file:
+            file.write(np.ascontiguousarray(self.matrix,dtype=np.float32).tobytes())
+        np.save(os.path.join(tmp,"ids.npy"),np.array(self._ids,dtype=str))
+        with open(os.path.join(tmp,"docs.jsonl"),"wb") as file:
+            for row in range(self._size):
+                doc=self._document(row)
+                file.write(json.dumps({'text':doc.page_content,'metadata':doc.metadata},ensure_ascii=False).encode("utf-8")+b"\n")
+                offsets[row+1]=file.tell()
+        np.save(os.path.join(tmp,"offsets.npy"),offsets)
+        if self.index is not None:
+            self.index.save(tmp)
+        if self.quantizer is not None:
+            saveQuantizer(self.quantizer,self._codes[:self._size],tmp)
+        self.metadataIndex.save(tmp)
+        info={'count':self._size,'dim':dim,'ivf':self.index is not None,'quantizer':self.quantizer is not None,'rerank':self.rerank}
+        with open(os.path.join(tmp,"index.json"),"w") as file:
+            json.dump(info,file)
+        # a store loaded from `path` keeps reading its memory-mapped files after the swap
+        replaceDirectory(tmp,path)
+
+    @classmethod
+    def load(cls, path:str, embedding:Embeddings) -> "MatrixVectorStore":
+        """Open a store written by save(), the vectors and docs are memory-mapped read-only"""
+        recoverDirectory(path)
+        with open(os.path.join(path,"index.json"),"r") as file:
+            info=json.load(file)
+        store=cls(embedding)
+        store._size=info['count']
+        if info['count']:
+            store._matrix=np.memmap(os.path.join(path,"vectors.f32"),dtype=np.float32,mode="r",shape=(info['count'],info['dim']))
+        store._ids=np.load(os.path.join(path,"ids.npy")).tolist()
+        store._rows={docId:row for row,docId in enumerate(store._ids)}
+        store._sidecar=_DocSidecar(os.path.join(path,"docs.jsonl"),np.load(os.path.join(path,"offsets.npy")))
+        if os.path.exists(os.path.join(path,"metadata-index.json")):
+            store.metadataIndex=MetadataIndex.load(path)
+        else:
+            store.metadataIndex.append([store._sidecar[row]['metadata'] for row in range(store._size)])
+        if info.get('ivf'):
+            store.index=IVFIndex.load(path)
+        if info.get('quantizer'):
+            store.quantizer,store._codes=loadQuantizer(path)
+            store.rerank=info['rerank']
+        return store
+
+    @classmethod
+    def from_texts(cls, texts:list[str], embedding:Embeddings, metadatas:Optional[list[dict]]=None, **kwargs:Any) -> "MatrixVectorStore":
+        store=cls(embedding)
+        store.add_texts(texts,metadatas=metadatas,ids=kwargs.get('ids'))
+        return store